@@ -1,42 +1,89 @@
-import os
+import os, time
+_import_started = time.perf_counter()
+# Only openai/httpx (the Moonshot clients) and Pillow/brotli (build-assets) wait for first use. numpy, spotipy,
+# requests and flask_session load here: PooledSpotify and the session interface subclass them and every playlist
+# request scores with numpy, so under preload_app the master pays for them once instead of each worker's first request
 from flask import Flask
+from .boot import boot_timer, after_fork, register_app
 from .extensions import db, migrate
-from .main import main as main_blueprint
-from .utils import init_app
+from .main import main as main_blueprint, reset_llm_client
+from .utils import init_app, reset_fanout_executor
+from .genres import genre_catalog
+from .spotify import spotify_clients
+from .tokens import token_manager
+from .feature_index import track_feature_index
+from .llm import async_llm
+from .emotion_classifier import emotion_classifier
+from .emotion_labels import label_resolver
+from .resilience import llm_guard
+from .sessions import server_sessions
+from .jobs import playlist_jobs
+from .warmer import warm_pools
+from .assets import build_assets_command, is_immutable
+from . import catalog
 from flask_cors import CORS
 from whitenoise import WhiteNoise
+boot_timer.imported(_import_started)
 
 def create_app(config_name='development'):
     base_dir = os.path.abspath(os.path.dirname(__file__))
     static_folder = os.path.join(base_dir, '..', 'public')
+    boot_timer.phases.clear()
 
-    app = Flask(__name__, instance_relative_config=True, static_folder=static_folder, static_url_path='/static')
-    app.config.from_object(f'app.config.{config_name.capitalize()}Config')
-    app.config['SESSION_COOKIE_SECURE'] = True
-    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    with boot_timer.phase('config'):
+        app = Flask(__name__, instance_relative_config=True, static_folder=static_folder, static_url_path='/static')
+        app.config.from_object(f'app.config.{config_name.capitalize()}Config')
+        if app.config['ASSETS_USE_BUILD'] and os.path.isfile(os.path.join(app.config['ASSETS_BUILD_DIR'], 'manifest.json')):
+            static_folder = os.path.abspath(app.config['ASSETS_BUILD_DIR'])  # Output of `flask build-assets`
+            app.static_folder = static_folder
+        app.config['SESSION_COOKIE_SECURE'] = True
+        app.config['SESSION_COOKIE_HTTPONLY'] = True
 
-    app.config['SPOTIFY_SCOPES'] = os.environ.get('SPOTIFY_SCOPES')
-    app.config['SPOTIFY_CLIENT_ID'] = os.environ.get('SPOTIFY_CLIENT_ID')
-    app.config['SPOTIFY_CLIENT_SECRET'] = os.environ.get('SPOTIFY_CLIENT_SECRET')
-    app.config['SPOTIFY_REDIRECT_URI'] = os.environ.get('SPOTIFY_REDIRECT_URI')
+        app.config['SPOTIFY_SCOPES'] = os.environ.get('SPOTIFY_SCOPES')
+        app.config['SPOTIFY_CLIENT_ID'] = os.environ.get('SPOTIFY_CLIENT_ID')
+        app.config['SPOTIFY_CLIENT_SECRET'] = os.environ.get('SPOTIFY_CLIENT_SECRET')
+        app.config['SPOTIFY_REDIRECT_URI'] = os.environ.get('SPOTIFY_REDIRECT_URI')
 
-    app.config['MOONSHOT_API_KEY'] = os.environ.get('MOONSHOT_API_KEY')
-    app.config['GENRES_PATH'] = init_app(app=app)
+        app.config['MOONSHOT_API_KEY'] = os.environ.get('MOONSHOT_API_KEY', app.config.get('MOONSHOT_API_KEY'))
+        app.config['GENRES_PATH'] = init_app(app=app)
 
-    CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
-    app.wsgi_app = WhiteNoise(app.wsgi_app, root=static_folder, prefix='static/')
+        CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
+        # Fingerprinted files get a one-year immutable Cache-Control; .br/.gz siblings are picked by Accept-Encoding
+        app.wsgi_app = WhiteNoise(app.wsgi_app, root=static_folder, prefix='static/', immutable_file_test=is_immutable)
+        app.cli.add_command(build_assets_command)
 
-    try:
-        os.makedirs(app.instance_path)
-    except OSError:
-        pass
+        try:
+            os.makedirs(app.instance_path)
+        except OSError:
+            pass
 
-    db.init_app(app)
-    migrate.init_app(app, db)
-    app.register_blueprint(main_blueprint)
+    with boot_timer.phase('extensions'):
+        db.init_app(app)
+        migrate.init_app(app, db)
+        server_sessions.init_app(app)
+        genre_catalog.init_app(app)
+        spotify_clients.init_app(app)
+        token_manager.init_app(app)
+        track_feature_index.init_app(app)
+        async_llm.init_app(app)
+        emotion_classifier.init_app(app)
+        label_resolver.init_app(app)
+        llm_guard.init_app(app)
+        playlist_jobs.init_app(app)
+        warm_pools.init_app(app)
+        app.register_blueprint(main_blueprint)
+
+    # Pools, executors and loop threads are rebuilt in each worker forked from a preloaded master
+    for reset in (spotify_clients.reset, token_manager.reset, catalog.reset, async_llm.reset,
+                  llm_guard.reset, playlist_jobs.reset, warm_pools.reset, reset_fanout_executor, reset_llm_client):
+        after_fork(reset)
+    register_app(app)
+    app.extensions['boot'] = boot_timer
 
     with app.app_context():
         from .main import init_api_client
-        init_api_client()
-        db.create_all()
+        init_api_client()  # The Moonshot client itself is built on first use
+        if app.config['AUTO_CREATE_SCHEMA']:
+            with boot_timer.phase('schema'):
+                db.create_all()
     return app
@@ -0,0 +1,163 @@
+import gzip, hashlib, json, os, re, shutil
+from io import BytesIO
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+HASH_LENGTH = 12
+# Fingerprinted names like webflow-style.3f2a9c1b7d0e.css; WhiteNoise serves these as immutable
+HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.\w+$" % HASH_LENGTH)
+COMPRESSIBLE = {'.css', '.js', '.svg', '.html', '.json', '.txt', '.md', '.map'}
+RESIZABLE = {'.jpg', '.jpeg', '.png'}
+SKIPPED = {'.html', '.md'}
+# References to public/ assets in HTML: /static/images/x.png, and the bare /js/... paths some pages use
+HTML_REFERENCE = re.compile(r"""(?P<quote>["'])(?:/static)?/(?P<path>(?:css|js|images)/[^"'?#]+)(?P=quote)""")
+CSS_REFERENCE = re.compile(r"""url\((?P<quote>["']?)(?!data:|https?:|//)(?P<path>[^"')?#]+)(?P<suffix>[^"')]*)(?P=quote)\)""")
+IMG_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+
+
+# Build-time only: imported on first use, so web workers that register the command never load them
+def _brotli():
+    try:
+        import brotli
+    except ImportError:  # Brotli variants are skipped; gzip still works
+        return None
+    return brotli
+
+def _pillow():
+    try:
+        from PIL import Image
+    except ImportError:  # No responsive image variants without Pillow
+        return None
+    return Image
+
+
+def is_immutable(path, url):
+    return bool(HASHED_NAME.search(url))
+
+def hashed_name(relative_path, content):
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+def _write(output, relative_path, content, min_compress_size):
+    path = os.path.join(output, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    if os.path.splitext(relative_path)[1].lower() in COMPRESSIBLE and len(content) >= min_compress_size:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))  # mtime=0 keeps builds reproducible
+        brotli = _brotli()
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content, quality=11))
+
+def _resize(source_path, relative_path, widths):
+    # (width, relative path, bytes) for every configured width narrower than the image
+    Image = _pillow()
+    if Image is None:
+        return []
+    root, ext = os.path.splitext(relative_path)
+    variants = []
+    with Image.open(source_path) as image:
+        for width in sorted(widths):
+            if width >= image.width:
+                break
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            output = _encode(resized, ext)
+            variants.append((width, f"{root}-{width}w{ext}", output))
+    return variants
+
+def _encode(image, ext):
+    buffer = BytesIO()
+    if ext.lower() == '.png':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, format='JPEG', quality=82, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+#* Build: fingerprint + precompress everything under public/, resize images, rewrite the HTML pages
+def build_assets(source, output, widths=(480, 960, 1600), min_compress_size=512):
+    if os.path.isdir(output):
+        shutil.rmtree(output)
+    manifest, variants = {}, {}
+    files = sorted(
+        os.path.relpath(os.path.join(directory, name), source).replace(os.sep, '/')
+        for directory, _, names in os.walk(source) for name in names
+    )
+    assets = [path for path in files if os.path.splitext(path)[1].lower() not in SKIPPED and '.' in os.path.basename(path)]
+
+    # Images and scripts first, so stylesheets can point at their hashed names
+    for relative_path in sorted(assets, key=lambda path: path.endswith('.css')):
+        with open(os.path.join(source, relative_path), 'rb') as f:
+            content = f.read()
+        if relative_path.endswith('.css'):
+            content = _rewrite_css(content.decode('utf-8'), relative_path, manifest).encode('utf-8')
+        if os.path.splitext(relative_path)[1].lower() in RESIZABLE:
+            for width, variant_path, variant in _resize(os.path.join(source, relative_path), relative_path, widths):
+                variant_name = hashed_name(variant_path, variant)
+                _write(output, variant_name, variant, min_compress_size)
+                variants.setdefault(relative_path, []).append({'width': width, 'path': variant_name})
+        name = hashed_name(relative_path, content)
+        manifest[relative_path] = name
+        _write(output, name, content, min_compress_size)
+        _write(output, relative_path, content, min_compress_size)  # Unhashed copy for references built at runtime
+
+    for relative_path in files:
+        if relative_path not in manifest:
+            with open(os.path.join(source, relative_path), 'rb') as f:
+                content = f.read()
+            if relative_path.endswith('.html'):
+                content = rewrite_html(content.decode('utf-8'), manifest, variants).encode('utf-8')
+            _write(output, relative_path, content, min_compress_size)
+
+    with open(os.path.join(output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'files': manifest, 'variants': variants}, f, indent=2, sort_keys=True)
+    return manifest, variants
+
+def _rewrite_css(css, css_path, manifest):
+    directory = os.path.dirname(css_path)
+    def replace(match):
+        target = os.path.normpath(os.path.join(directory, match['path'])).replace(os.sep, '/')
+        if target not in manifest:
+            return match.group(0)
+        hashed = os.path.relpath(manifest[target], directory).replace(os.sep, '/')
+        return f"url({match['quote']}{hashed}{match['suffix']}{match['quote']})"
+    return CSS_REFERENCE.sub(replace, css)
+
+def rewrite_html(html, manifest, variants=None):
+    variants = variants or {}
+    originals = {name: path for path, name in manifest.items()}
+
+    def replace_reference(match):
+        path = match['path']
+        if path not in manifest:
+            return match.group(0)
+        return f"{match['quote']}/static/{manifest[path]}{match['quote']}"
+
+    def add_srcset(match):
+        tag = match.group(0)
+        source = re.search(r'src="/static/([^"]+)"', tag)
+        original = originals.get(source.group(1)) if source else None
+        if original not in variants or 'srcset=' in tag:
+            return tag
+        candidates = [f"/static/{v['path']} {v['width']}w" for v in variants[original]]
+        return tag[:-1].rstrip('/').rstrip() + f' srcset="{", ".join(candidates)}" sizes="100vw">'
+
+    html = HTML_REFERENCE.sub(replace_reference, html)
+    return IMG_TAG.sub(add_srcset, html)
+
+
+@click.command('build-assets')
+@click.option('--output', default=None, help="Build directory (defaults to ASSETS_BUILD_DIR).")
+@with_appcontext
+def build_assets_command(output):
+    """Fingerprint, precompress and resize public/ into the assets build directory."""
+    config = current_app.config
+    source = config.get('ASSETS_SOURCE_DIR') or os.path.join(current_app.root_path, '..', 'public')
+    output = output or config['ASSETS_BUILD_DIR']
+    manifest, variants = build_assets(source, output, widths=config.get('ASSETS_IMAGE_WIDTHS', (480, 960, 1600)))
+    click.echo(f"Built {len(manifest)} assets and {sum(map(len, variants.values()))} image variants into {output}"
+               + ("" if _brotli() else " (brotli not installed, gzip only)")
+               + ("" if _pillow() else " (Pillow not installed, no image variants)"))
@@ -0,0 +1,60 @@
+import os, time, weakref
+from contextlib import contextmanager
+from .extensions import db
+
+
+#* Boot timings: how long importing the app package and each create_app phase took in this process
+class BootTimer:
+    def __init__(self):
+        self.imports = None
+        self.phases = {}
+        self.pid = os.getpid()
+        self.forked = False
+
+    def imported(self, started):
+        self.imports = round(time.perf_counter() - started, 4)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - started, 4)
+
+    def stats(self):
+        return {
+            'pid': self.pid,
+            'forked': self.forked,  # True in workers forked from a preloaded master
+            'import_seconds': self.imports,
+            'phases': dict(self.phases),
+            'total_seconds': round((self.imports or 0) + sum(self.phases.values()), 4)
+        }
+
+
+boot_timer = BootTimer()
+
+
+#* Fork safety: with gunicorn --preload the app is built once in the master, so pools, executors and
+# event-loop threads created there must not leak into workers. Resets run in every forked child
+_resets = []
+_apps = weakref.WeakSet()
+
+def after_fork(reset):
+    if reset not in _resets:
+        _resets.append(reset)
+
+def register_app(app):
+    _apps.add(app)
+
+def reinit_after_fork():
+    boot_timer.pid, boot_timer.forked = os.getpid(), True
+    for reset in _resets:
+        reset()
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)  # Leave the parent's connections alone, open new ones on demand
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reinit_after_fork)
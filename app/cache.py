@@ -0,0 +1,159 @@
+import threading, time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+#* Bounded in-process cache with per-entry TTL and least-recently-used eviction
+class TTLCache:
+    def __init__(self, maxsize=256, ttl=300, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]  # Expired
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            if value is not None:
+                self.set(key, value, ttl=ttl)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def _evict(self):
+        # Caller holds the lock. Drop expired entries from the cold end first, then trim to size
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now and len(self._data) <= self.maxsize:
+                break
+            del self._data[key]
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+#* Request coalescing: concurrent callers with the same key share one in-flight upstream call
+class SingleFlight:
+    def __init__(self, timeout=None, name=None):
+        self.timeout = timeout  # How long a follower waits for the leader before giving up
+        self.name = name
+        self.leaders = 0
+        self.followers = 0
+        self.timeouts = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def configure(self, timeout=None):
+        self.timeout = timeout
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            if not call.event.wait(self.timeout if timeout is None else timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Timed out waiting for in-flight call {key!r}")
+            if call.error is not None:
+                raise call.error  # Followers see the leader's failure too
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self):
+        calls = self.leaders + self.followers
+        return {
+            'in_flight': len(self._calls),
+            'upstream_calls': self.leaders,
+            'coalesced': self.followers,
+            'timeouts': self.timeouts,
+            'coalesced_rate': round(self.followers / calls, 4) if calls else None
+        }
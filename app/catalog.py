@@ -0,0 +1,114 @@
+import random, threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func
+from .extensions import db
+from .models import Song
+from .feature_index import track_feature_index, FeatureIndex
+
+PITCH_CLASSES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+AUDIO_FEATURES_BATCH = 100  # Spotify's limit per audio-features call
+
+_ingest_executor = None
+_ingest_lock = threading.Lock()
+
+
+#* 1. Serve a playlist from the local catalog with one indexed query
+def local_tracks(emotion, genres=None, min_pool=40, max_count=20, target=None):
+    # target: the emotion's scoring profile; without a genre filter the feature index picks the
+    # tracks closest to it instead of relying on the emotion the tracks were ingested under
+    if target is not None and not genres and current_app.config.get('FEATURE_INDEX_ENABLED', True):
+        return nearest_tracks(target, min_pool, max_count)
+
+    query = Song.query.filter(Song.emotion == emotion)
+    if genres:
+        query = query.filter(Song.genre.in_(genres))
+    pool = query.order_by(func.random()).limit(max(min_pool, max_count)).all()
+    if len(pool) < min_pool:
+        return None  # Too thin for this emotion/genre, caller falls back to Spotify
+    return pool[:max_count]
+
+
+def nearest_tracks(target, min_pool=40, max_count=20):
+    track_feature_index.sync()
+    hits = track_feature_index.nearest(*FeatureIndex.target_box(target), k=max(min_pool, max_count))
+    if len(hits) < min_pool:
+        return None
+    chosen = random.sample([spotify_id for _, spotify_id in hits], k=min(max_count, len(hits)))  # min_pool may be below max_count
+    return Song.query.filter(Song.spotify_id.in_(chosen)).all()
+
+
+#* 2. Grow the catalog from tracks fetched from Spotify, with their audio features
+def song_from_features(track, features, emotion, genre=None):
+    return Song(
+        spotify_id=track['id'],
+        title=track['name'][:100],
+        artist=track['artists'][0]['name'][:100],
+        album=(track.get('album') or {}).get('name', '')[:100],
+        popularity=track.get('popularity') or 0,
+        emotion=emotion,
+        genre=genre,
+        danceability=features['danceability'],
+        energy=features['energy'],
+        key=PITCH_CLASSES[features['key']] if 0 <= features['key'] < 12 else 'unknown',
+        loudness=features['loudness'],
+        mode='major' if features['mode'] == 1 else 'minor',
+        speechiness=features['speechiness'],
+        acousticness=features['acousticness'],
+        instrumentalness=features['instrumentalness'],
+        liveness=features['liveness'],
+        valence=features['valence'],
+        tempo=features['tempo'],
+        duration_ms=features['duration_ms']
+    )
+
+def ingest_tracks(sp, tracks, emotion, genres=None):
+    # tracks: Spotify track dicts; genres: optional track id -> genre the track was found under
+    genres = genres or {}
+    tracks = {track['id']: track for track in tracks if track and track.get('id')}
+    if not tracks:
+        return []
+    known = {row.spotify_id for row in Song.query.with_entities(Song.spotify_id).filter(Song.spotify_id.in_(tracks))}
+    new_ids = [track_id for track_id in tracks if track_id not in known]
+
+    songs = []
+    for start in range(0, len(new_ids), AUDIO_FEATURES_BATCH):
+        batch = new_ids[start:start + AUDIO_FEATURES_BATCH]
+        for features in sp.audio_features(batch) or []:
+            if features and features.get('id') in tracks:
+                songs.append(song_from_features(tracks[features['id']], features, emotion, genres.get(features['id'])))
+    if songs:
+        db.session.add_all(songs)
+        db.session.commit()
+        if track_feature_index.loaded:
+            track_feature_index.add_songs(songs)
+    return songs
+
+def _get_ingest_executor():
+    global _ingest_executor
+    if _ingest_executor is None:
+        with _ingest_lock:
+            if _ingest_executor is None:
+                _ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='catalog-ingest')
+    return _ingest_executor
+
+def _ingest_in_background(app, sp, tracks, emotion, genres):
+    with app.app_context():
+        try:
+            ingest_tracks(sp, tracks, emotion, genres)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f"Catalog ingest failed: {e}")
+
+def schedule_ingest(sp, items, emotion, genres=None):
+    # Ingest happens off the request path; items are playlist_tracks items
+    if not current_app.config.get('CATALOG_INGEST_ENABLED', True):
+        return None
+    limit = current_app.config.get('CATALOG_INGEST_LIMIT', 100)
+    tracks = [item['track'] for item in items[:limit] if item and item.get('track')]
+    app = current_app._get_current_object()
+    return _get_ingest_executor().submit(_ingest_in_background, app, sp, tracks, emotion, genres)
+
+def reset():
+    global _ingest_executor
+    _ingest_executor = None
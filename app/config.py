@@ -11,6 +11,18 @@ class Config:
     basedir = os.path.abspath(os.path.dirname(__file__))
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, '..', 'instance', 'main.db')).replace("postgres://", "postgresql://")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connections per worker, shared by its request threads/greenlets; gunicorn.conf.py splits DB_MAX_CONNECTIONS across workers. SQLite keeps its own pooling
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds a request waits for a free connection
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_pre_ping': True
+    }
+    # db.create_all() at boot; only development and testing do it by default, deployments run `flask db upgrade`
+    AUTO_CREATE_SCHEMA = os.environ.get('AUTO_CREATE_SCHEMA', 'False').lower() in ('true', '1', 't')
 
     SPOTIFY_CLIENT_ID = os.environ.get('SPOTIFY_CLIENT_ID')
     SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET')
@@ -19,25 +31,136 @@ class Config:
 
     MOONSHOT_API_KEY = os.environ.get('MOONSHOT_API_KEY')   
 
+    # Async Moonshot client (/api/refineEmotion/async): shared pool and explicit timeouts
+    LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', 3))    # seconds
+    LLM_READ_TIMEOUT = float(os.environ.get('LLM_READ_TIMEOUT', 10))         # seconds
+    LLM_REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT', 12))   # seconds, whole call incl. queueing
+    LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 100))
+
+    # Moonshot resilience: the breaker opens after LLM_BREAKER_FAILURES consecutive errors or answers slower
+    # than LLM_LATENCY_SLO, and refineEmotion answers with the main emotion until a probe succeeds
+    LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 5))
+    LLM_BREAKER_RESET_TIMEOUT = float(os.environ.get('LLM_BREAKER_RESET_TIMEOUT', 30))  # seconds
+    LLM_LATENCY_SLO = float(os.environ.get('LLM_LATENCY_SLO', 8))                       # seconds
+    LLM_HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'True').lower() in ('true', '1', 't')
+    LLM_HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 0.95))  # Hedge once a call outlives this percentile
+    LLM_HEDGE_MIN_SAMPLES = int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', 20))
+    LLM_HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', 0.5))     # seconds
+    # Threads for all sync Moonshot calls, hedges included: the per-worker cap on concurrent LLM calls
+    LLM_CALL_WORKERS = int(os.environ.get('LLM_CALL_WORKERS', 16))
+
+    # /api/refineEmotion result cache (per worker)
+    REFINE_CACHE_SIZE = int(os.environ.get('REFINE_CACHE_SIZE', 2048))
+    REFINE_CACHE_TTL = int(os.environ.get('REFINE_CACHE_TTL', 3600))  # seconds
+
+    # Local lexical classifier in front of Moonshot; texts scoring below the threshold still go to the LLM
+    EMOTION_CLASSIFIER_ENABLED = os.environ.get('EMOTION_CLASSIFIER_ENABLED', 'True').lower() in ('true', '1', 't')
+    EMOTION_CLASSIFIER_THRESHOLD = float(os.environ.get('EMOTION_CLASSIFIER_THRESHOLD', 0.6))  # 0..1
+    # Model outputs / emotion strings snap to the nearest label only above this trigram similarity
+    EMOTION_LABEL_MIN_CONFIDENCE = float(os.environ.get('EMOTION_LABEL_MIN_CONFIDENCE', 0.5))  # 0..1
+
     # Songs and Playlists Track Numbers
-    SONGS_PER_PAGE = 20
+    SONGS_PER_PAGE = 20  # Also the default page size of /api/get_saved_tracks
+    MAX_SONGS_PER_PAGE = int(os.environ.get('MAX_SONGS_PER_PAGE', 100))
+    MAX_TOP_SONGS_BATCH = int(os.environ.get('MAX_TOP_SONGS_BATCH', 100))  # links per /api/save_top_songs request
     MIN_PLAYLIST_TRACKS = 10
     MAX_PLAYLIST_TRACKS = 20
 
+    # Spotify OAuth tokens (users table): refreshed in the background once less than TOKEN_REFRESH_AHEAD
+    # seconds remain; a request only waits for the refresh under TOKEN_REFRESH_MARGIN
+    TOKEN_REFRESH_AHEAD = int(os.environ.get('TOKEN_REFRESH_AHEAD', 1440))
+    TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', 60))
+    TOKEN_REFRESH_WORKERS = int(os.environ.get('TOKEN_REFRESH_WORKERS', 2))
+
+    # Pooled Spotify clients: one keep-alive HTTP pool per worker, clients reused per access token
+    SPOTIFY_POOL_SIZE = int(os.environ.get('SPOTIFY_POOL_SIZE', 10))            # connections per host
+    SPOTIFY_RETRIES = int(os.environ.get('SPOTIFY_RETRIES', 3))
+    SPOTIFY_BACKOFF_FACTOR = float(os.environ.get('SPOTIFY_BACKOFF_FACTOR', 0.3))
+    SPOTIFY_REQUESTS_TIMEOUT = float(os.environ.get('SPOTIFY_REQUESTS_TIMEOUT', 5))  # seconds
+    SPOTIFY_CLIENT_IDLE_TIMEOUT = int(os.environ.get('SPOTIFY_CLIENT_IDLE_TIMEOUT', 900))  # seconds
+    SPOTIFY_MAX_CLIENTS = int(os.environ.get('SPOTIFY_MAX_CLIENTS', 1024))
+
+    # Spotify search/playlist_tracks response cache (per worker)
+    SPOTIFY_CACHE_SIZE = int(os.environ.get('SPOTIFY_CACHE_SIZE', 512))
+    SPOTIFY_SEARCH_CACHE_TTL = int(os.environ.get('SPOTIFY_SEARCH_CACHE_TTL', 600))   # seconds
+    SPOTIFY_TRACKS_CACHE_TTL = int(os.environ.get('SPOTIFY_TRACKS_CACHE_TTL', 900))   # seconds
+
+    # Followers of a coalesced (single-flight) Spotify or Moonshot call give up after this long
+    SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 15))  # seconds
+
+    # Candidate fan-out: several genres x several playlists queried concurrently per request
+    PLAYLIST_FANOUT_ENABLED = os.environ.get('PLAYLIST_FANOUT_ENABLED', 'True').lower() in ('true', '1', 't')
+    PLAYLIST_FANOUT_GENRES = int(os.environ.get('PLAYLIST_FANOUT_GENRES', 3))
+    PLAYLIST_FANOUT_PLAYLISTS = int(os.environ.get('PLAYLIST_FANOUT_PLAYLISTS', 2))
+    PLAYLIST_FANOUT_WORKERS = int(os.environ.get('PLAYLIST_FANOUT_WORKERS', 8))
+    PLAYLIST_FANOUT_TIMEOUT = float(os.environ.get('PLAYLIST_FANOUT_TIMEOUT', 4.0))  # seconds per request
+
+    # Playlist jobs (/api/playlist_jobs): generation runs on a per-worker pool, progress is polled or streamed (SSE)
+    PLAYLIST_JOB_WORKERS = int(os.environ.get('PLAYLIST_JOB_WORKERS', 4))            # concurrent generations per worker
+    PLAYLIST_JOB_MAX_PENDING = int(os.environ.get('PLAYLIST_JOB_MAX_PENDING', 50))    # beyond this, 503 + Retry-After
+    PLAYLIST_JOB_TTL = int(os.environ.get('PLAYLIST_JOB_TTL', 600))                   # seconds a finished job stays readable
+    PLAYLIST_JOB_PERSIST = os.environ.get('PLAYLIST_JOB_PERSIST', 'True').lower() in ('true', '1', 't')  # playlist_jobs table
+    PLAYLIST_JOB_POLL_INTERVAL = float(os.environ.get('PLAYLIST_JOB_POLL_INTERVAL', 1.0))  # seconds, following another worker's job
+    PLAYLIST_JOB_STREAM_TIMEOUT = int(os.environ.get('PLAYLIST_JOB_STREAM_TIMEOUT', 25))   # seconds per SSE connection; clients reconnect
+
+    # Local track catalog (song table): served first, fed from Spotify results in the background
+    LOCAL_FIRST_PLAYLISTS = os.environ.get('LOCAL_FIRST_PLAYLISTS', 'True').lower() in ('true', '1', 't')
+    LOCAL_CATALOG_MIN_POOL = int(os.environ.get('LOCAL_CATALOG_MIN_POOL', 40))  # fewer matches than this falls back to Spotify
+    CATALOG_INGEST_ENABLED = os.environ.get('CATALOG_INGEST_ENABLED', 'True').lower() in ('true', '1', 't')
+    CATALOG_INGEST_LIMIT = int(os.environ.get('CATALOG_INGEST_LIMIT', 100))      # tracks per request
+    FEATURE_INDEX_ENABLED = os.environ.get('FEATURE_INDEX_ENABLED', 'True').lower() in ('true', '1', 't')
+    FEATURE_INDEX_RELOAD_INTERVAL = int(os.environ.get('FEATURE_INDEX_RELOAD_INTERVAL', 60))  # seconds between catch-up reads
+
+    # Warm pools: candidate tracks for the hottest emotion x genre pairs, refreshed by a per-worker background
+    # thread with an app (client-credentials) Spotify token; needs SPOTIFY_CLIENT_ID/SECRET
+    WARM_POOL_ENABLED = os.environ.get('WARM_POOL_ENABLED', 'True').lower() in ('true', '1', 't')
+    WARM_POOL_INTERVAL = int(os.environ.get('WARM_POOL_INTERVAL', 300))          # seconds between refresh cycles
+    WARM_POOL_MAX_AGE = int(os.environ.get('WARM_POOL_MAX_AGE', 1800))           # seconds a pool is served; refreshed at half
+    WARM_POOL_HOT_PAIRS = int(os.environ.get('WARM_POOL_HOT_PAIRS', 24))         # emotion/genre pairs kept warm
+    WARM_POOL_MAX_POOLS = int(os.environ.get('WARM_POOL_MAX_POOLS', 64))
+    WARM_POOL_FETCHES_PER_CYCLE = int(os.environ.get('WARM_POOL_FETCHES_PER_CYCLE', 8))
+    WARM_POOL_TRACKS = int(os.environ.get('WARM_POOL_TRACKS', 100))              # tracks kept per pool
+
+    # Genre catalog (public/genres.md), checked for changes at most once per interval
+    GENRES_PRELOAD = True
+    GENRES_RELOAD_INTERVAL = int(os.environ.get('GENRES_RELOAD_INTERVAL', 60))  # seconds
+
+    # Static assets: `flask build-assets` writes fingerprinted, precompressed copies of public/ here, and
+    # the app serves that directory instead of public/ once it exists
+    ASSETS_SOURCE_DIR = os.path.join(basedir, '..', 'public')
+    ASSETS_BUILD_DIR = os.environ.get('ASSETS_BUILD_DIR', os.path.join(basedir, '..', 'build', 'public'))
+    ASSETS_USE_BUILD = os.environ.get('ASSETS_USE_BUILD', 'True').lower() in ('true', '1', 't')
+    ASSETS_IMAGE_WIDTHS = tuple(int(w) for w in os.environ.get('ASSETS_IMAGE_WIDTHS', '480,960,1600').split(','))
+
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)  # Set session lifetime to 1 hour
     SESSION_PERMANENT = True                         # Enable permanent sessions
     SESSION_COOKIE_SECURE = True                     # Secure cookies for HTTPS
     SESSION_COOKIE_HTTPONLY = True                   # HttpOnly cookies
     SESSION_COOKIE_SAMESITE = 'Lax'                  # Cross-site cookie policy
+    # Sessions live server-side and the cookie only carries their id: 'sqlalchemy' (app/sessions.py), any other
+    # Flask-Session backend such as 'filesystem', or 'cookie' for Flask's signed-cookie sessions
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'sqlalchemy')
+    SESSION_FILE_DIR = os.environ.get('SESSION_FILE_DIR', os.path.join(basedir, '..', 'instance', 'flask_session'))
+    SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 4096))
+    SESSION_CACHE_TTL = int(os.environ.get('SESSION_CACHE_TTL', 30))                 # seconds a cached copy lives; every read still checks the row's version
+    SESSION_REFRESH_INTERVAL = int(os.environ.get('SESSION_REFRESH_INTERVAL', 300))  # expiry drift (s) before an unchanged session is rewritten
+    SESSION_CLEANUP_INTERVAL = int(os.environ.get('SESSION_CLEANUP_INTERVAL', 600))  # seconds between expired-row sweeps
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    AUTO_CREATE_SCHEMA = os.environ.get('AUTO_CREATE_SCHEMA', 'True').lower() in ('true', '1', 't')
 class ProductionConfig(Config):
     DEBUG = False
 class TestingConfig(Config):
     TESTING = True
+    MOONSHOT_API_KEY = 'test-key'  # Clients get built; tests stub their calls
+    AUTO_CREATE_SCHEMA = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    ASSETS_USE_BUILD = False
+    PLAYLIST_JOB_PERSIST = False
+    WARM_POOL_ENABLED = False
 
 config = {
     'development': DevelopmentConfig,
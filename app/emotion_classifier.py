@@ -0,0 +1,192 @@
+import re, threading
+from collections import defaultdict
+
+# Canonical labels (main.emotion_map / public/emotions.md) with English and Chinese phrases that name them
+SYNONYMS = {
+    "Joy": ["joy", "joyful", "happy", "happiness", "glad", "delighted", "cheerful", "elated",
+            "快乐", "开心", "高兴", "喜悦", "愉快"],
+    "Love": ["love", "in love", "loving", "adore", "romance", "romantic", "crush",
+             "爱", "爱情", "恋爱", "心动"],
+    "Devotion": ["devotion", "devoted", "dedicated", "loyal", "faithful", "worship",
+                 "奉献", "忠诚", "虔诚", "专一"],
+    "Tender feelings": ["tender", "tenderness", "affection", "affectionate", "warm hearted", "gentle", "caring",
+                        "温柔", "柔情", "温暖", "体贴"],
+    "Suffering": ["suffering", "suffer", "pain", "painful", "hurting", "agony", "torment",
+                  "痛苦", "煎熬", "折磨", "受苦"],
+    "Weeping": ["weeping", "weep", "crying", "cry", "tears", "sobbing",
+                "哭", "哭泣", "流泪", "眼泪"],
+    "High spirits": ["high spirits", "excited", "thrilled", "energetic", "hyped", "pumped", "euphoric", "ecstatic",
+                     "兴奋", "激动", "振奋", "兴高采烈"],
+    "Low spirits": ["low spirits", "feeling down", "blue", "gloomy", "sad", "sadness", "unhappy", "moody",
+                    "低落", "情绪低落", "难过", "伤心", "郁闷", "不开心"],
+    "Anxiety": ["anxiety", "anxious", "nervous", "worried", "worry", "stressed", "stress", "uneasy", "panic",
+                "焦虑", "紧张", "担心", "不安", "压力"],
+    "Grief": ["grief", "grieving", "mourning", "loss", "bereaved", "heartbroken",
+              "悲伤", "哀悼", "悲痛", "心碎"],
+    "Dejection": ["dejection", "dejected", "discouraged", "disheartened", "disappointed", "let down",
+                  "沮丧", "失望", "灰心", "气馁"],
+    "Despair": ["despair", "hopeless", "hopelessness", "desperate",
+                "绝望", "无望", "万念俱灰"],
+    "Anger": ["anger", "angry", "mad", "furious", "rage", "pissed", "irritated",
+              "生气", "愤怒", "发火", "气愤", "恼火"],
+    "Hatred": ["hatred", "hate", "loathe", "hostile", "resentment",
+               "恨", "仇恨", "憎恨", "讨厌"],
+    "Disdain": ["disdain", "scorn", "condescending",
+                "鄙视", "不屑", "轻视"],
+    "Contempt": ["contempt", "contemptuous", "despise", "sneer",
+                 "蔑视", "藐视", "看不起"],
+    "Disgust": ["disgust", "disgusted", "gross", "revolted", "sickened", "nauseated",
+                "恶心", "厌恶", "反感"],
+    "Guilt": ["guilt", "guilty", "regret", "remorse", "ashamed",
+              "内疚", "愧疚", "后悔", "自责"],
+    "Pride": ["pride", "proud", "accomplished", "triumphant",
+              "骄傲", "自豪", "得意"],
+    "Helplessness": ["helplessness", "helpless", "powerless", "trapped", "overwhelmed",
+                     "无助", "无力", "无奈", "束手无策"],
+    "Patience": ["patience", "patient", "tolerant",
+                 "耐心", "忍耐", "等待"],
+    "Affirmation": ["affirmation", "affirmed", "confident", "reassured", "validated",
+                    "肯定", "认可", "自信", "积极"],
+    "Negation": ["negation", "denial", "rejecting", "numb", "indifferent",
+                 "否定", "拒绝", "否认", "麻木"],
+    "Surprise": ["surprise", "surprised", "shocked", "astonished", "amazed", "unexpected",
+                 "惊讶", "吃惊", "震惊", "意外", "惊喜"],
+    "Fear": ["fear", "afraid", "scared", "frightened", "terrified", "horror", "dread",
+             "害怕", "恐惧", "惊恐", "怕"],
+    "Self-attention": ["self attention", "self conscious", "self aware", "introspective",
+                       "自我关注", "自省"],
+    "Shyness": ["shyness", "shy", "timid", "bashful",
+                "害羞", "羞涩", "腼腆"],
+    "Modesty": ["modesty", "modest", "humble", "humility",
+                "谦虚", "谦逊", "低调"],
+    "Blushing": ["blushing", "blush", "embarrassed", "flustered", "red faced",
+                 "脸红", "尴尬", "难为情"],
+    "Reflection": ["reflection", "reflective", "thoughtful", "contemplative", "pensive", "nostalgic",
+                   "反思", "沉思", "思考", "怀旧"],
+    "Mediation": ["meditation", "meditative", "mediation", "calm", "peaceful", "serene", "zen", "tranquil",
+                  "冥想", "平静", "宁静", "放松"],
+    "Ill-temper": ["ill temper", "ill tempered", "grumpy", "cranky", "irritable", "bad mood", "short tempered",
+                   "暴躁", "脾气差", "易怒", "烦躁"],
+    "Sulkiness": ["sulkiness", "sulky", "sulking", "pouting", "sullen",
+                  "闷闷不乐", "赌气", "生闷气"],
+    "Determination": ["determination", "determined", "motivated", "driven", "resolute", "ambitious",
+                      "决心", "坚定", "奋斗", "坚持"]
+}
+
+_WORD = re.compile(r"[a-z]+(?:'[a-z]+)?")
+_CJK = re.compile(r"[\u4e00-\u9fff]+")
+_SUFFIXES = ('ing', 'ed', 'ly', 'ness', 's')
+STOPWORDS = frozenset({'i', "i'm", 'im', 'am', 'is', 'are', 'was', 'be', 'feel', 'so', 'very', 'really', 'a', 'an',
+                       'the', 'and', 'or', 'my', 'me', 'in', 'of', 'to', 'at', 'it', 'this', 'that', 'just', 'today'})
+NEGATIONS = frozenset({'not', 'no', 'never', "don't", "didn't", "isn't", "wasn't", "can't", 'nothing'})
+CJK_NEGATIONS = frozenset('不没别')
+
+
+def _stem(word):
+    # Just enough to let "crying"/"cry" and "tears"/"tear" meet; applied to labels and input alike
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith(('ss', 'us')):
+            return word[:-len(suffix)]
+    return word
+
+def word_features(text):
+    # English word unigrams (minus filler words) and bigrams
+    words = [_stem(word) for word in _WORD.findall(text.casefold().replace('-', ' '))]
+    found = {word for word in words if word not in STOPWORDS}
+    found.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return found, words
+
+
+#* Token / n-gram index over the emotion labels, so short unambiguous texts skip the LLM entirely
+class EmotionClassifier:
+    def __init__(self, synonyms=None, threshold=0.6):
+        self.threshold = threshold
+        self.enabled = True
+        self.classified = 0
+        self.answered = 0
+        self._lock = threading.Lock()
+        self._index = {}  # feature -> ((label, weight), ...)
+        self._longest_phrase = 1
+        self.build(synonyms or SYNONYMS)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('EMOTION_CLASSIFIER_ENABLED', self.enabled)
+        self.threshold = app.config.get('EMOTION_CLASSIFIER_THRESHOLD', self.threshold)
+        app.extensions['emotion_classifier'] = self
+
+    def build(self, synonyms):
+        labels_by_feature = defaultdict(set)
+        for label, phrases in synonyms.items():
+            for phrase in [label, *phrases]:
+                cjk = _CJK.fullmatch(phrase)
+                for feature in [phrase] if cjk else word_features(phrase)[0]:
+                    labels_by_feature[feature].add(label)
+        # A feature shared by n labels is worth 1/n to each, so common words barely move the score
+        self._index = {
+            feature: tuple((label, 1 / len(labels)) for label in sorted(labels))
+            for feature, labels in labels_by_feature.items()
+        }
+        self._longest_phrase = max((len(feature) for feature in self._index if _CJK.fullmatch(feature)), default=1)
+
+    @property
+    def labels(self):
+        return {label for matches in self._index.values() for label, _ in matches}
+
+    def _cjk_features(self, text):
+        # Chinese has no spaces: greedy longest match against the indexed phrases, so 不开心 is read
+        # as one phrase rather than 不 + 开心. Also reports a negation left outside every phrase
+        found, negated = set(), False
+        for run in _CJK.findall(text):
+            i = 0
+            while i < len(run):
+                for size in range(min(self._longest_phrase, len(run) - i), 0, -1):
+                    if run[i:i + size] in self._index:
+                        found.add(run[i:i + size])
+                        i += size
+                        break
+                else:
+                    negated = negated or run[i] in CJK_NEGATIONS
+                    i += 1
+        return found, negated
+
+    def classify(self, text):
+        # Returns (label, confidence); confidence is the winner's margin over the runner-up
+        found, words = word_features(text or '')
+        cjk_found, negated = self._cjk_features(text or '')
+        scores = defaultdict(float)
+        for feature in found | cjk_found:
+            for label, weight in self._index.get(feature, ()):
+                scores[label] += weight
+        if not scores:
+            return None, 0.0
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        best, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = (top - runner_up) / top * min(top, 1.0)
+        if negated or NEGATIONS.intersection(words):
+            confidence /= 2  # "not happy" names the opposite of what it matches; let the LLM read it
+        return best, round(confidence, 4)
+
+    def resolve(self, text):
+        # The label when the classifier is confident enough, otherwise None (ask the LLM)
+        if not self.enabled:
+            return None
+        label, confidence = self.classify(text)
+        answered = label is not None and confidence >= self.threshold
+        with self._lock:
+            self.classified += 1
+            self.answered += answered
+        return label if answered else None
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'threshold': self.threshold,
+            'classified': self.classified,
+            'answered_locally': self.answered,
+            'llm_skip_rate': round(self.answered / self.classified, 4) if self.classified else None,
+            'features': len(self._index)
+        }
+
+
+emotion_classifier = EmotionClassifier()
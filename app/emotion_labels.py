@@ -0,0 +1,86 @@
+import re
+from collections import Counter, defaultdict
+from .emotion_classifier import SYNONYMS
+
+# Spellings the model (or a client) produces for a label that are not synonyms of it
+ALIASES = {
+    "Mediation": ["meditation", "meditating"],
+    "Tender feelings": ["tender feeling", "tenderness"],
+    "High spirits": ["high spirit", "high-spirited"],
+    "Low spirits": ["low spirit", "low-spirited"],
+    "Self-attention": ["self attention", "selfattention"],
+    "Ill-temper": ["ill temper", "ill-tempered", "illtemper"]
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_LABEL_PREFIX = re.compile(r"^(?:emotion|label|answer|情感|答案)\s*[:：]\s*", re.IGNORECASE)
+
+
+def normalize(text):
+    # "  'Tender feelings.' " -> "tender feelings"
+    text = _LABEL_PREFIX.sub('', (text or '').strip())
+    text = _PUNCTUATION.sub(' ', text.replace('-', ' ').casefold())
+    return ' '.join(text.split())
+
+def trigrams(text):
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+#* Map any model output or user string onto a canonical emotion label, with a confidence
+class LabelResolver:
+    def __init__(self, synonyms=None, aliases=None, min_confidence=0.5):
+        self.min_confidence = min_confidence
+        self._exact = {}                   # normalized spelling -> label
+        self._grams = defaultdict(list)    # trigram -> [(spelling, count)]
+        self._sizes = {}                   # spelling -> number of trigrams
+        self.build(synonyms or SYNONYMS, aliases or ALIASES)
+
+    def init_app(self, app):
+        self.min_confidence = app.config.get('EMOTION_LABEL_MIN_CONFIDENCE', self.min_confidence)
+        app.extensions['label_resolver'] = self
+
+    def build(self, synonyms, aliases):
+        self.labels = tuple(synonyms)
+        for label in self.labels:
+            for spelling in [label, *aliases.get(label, ()), *synonyms[label]]:
+                self._exact.setdefault(normalize(spelling), label)
+        # Fuzzy matching only runs against the labels and their aliases, not the looser synonyms
+        for label in self.labels:
+            for spelling in {normalize(s) for s in [label, *aliases.get(label, ())]}:
+                grams = trigrams(spelling)
+                self._sizes[spelling] = sum(grams.values())
+                for gram, count in grams.items():
+                    self._grams[gram].append((spelling, count))
+
+    def resolve(self, text):
+        # Returns (label, confidence): 1.0 for a known spelling, 0.9 when the text contains exactly
+        # one label ("The emotion is Grief."), otherwise the trigram similarity of the closest label
+        normalized = normalize(text)
+        if not normalized:
+            return None, 0.0
+        if normalized in self._exact:
+            return self._exact[normalized], 1.0
+
+        padded = f" {normalized} "
+        contained = {label for label in self.labels if f" {normalize(label)} " in padded}
+        if len(contained) == 1:
+            return contained.pop(), 0.9
+
+        grams = trigrams(normalized)
+        shared = defaultdict(int)
+        for gram, count in grams.items():
+            for spelling, indexed in self._grams.get(gram, ()):
+                shared[spelling] += min(count, indexed)
+        if not shared:
+            return None, 0.0
+        size = sum(grams.values())
+        spelling, common = max(shared.items(), key=lambda item: item[1] / (size + self._sizes[item[0]] - item[1]))
+        return self._exact[spelling], round(common / (size + self._sizes[spelling] - common), 4)
+
+    def canonical(self, text, default=None):
+        label, confidence = self.resolve(text)
+        return label if label is not None and confidence >= self.min_confidence else default
+
+
+label_resolver = LabelResolver()
@@ -1,6 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
 
 # Initialize extensions
 db = SQLAlchemy()
-migrate = Migrate()
\ No newline at end of file
+migrate = Migrate()
+
+
+# Multi-row INSERT that skips rows hitting a unique constraint (ON CONFLICT DO NOTHING)
+def insert_ignore(model, rows, index_elements):
+    if not rows:
+        return None
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(model).on_conflict_do_nothing(index_elements=index_elements)
+    else:
+        statement = insert(model).prefix_with('IGNORE')  # MySQL / MariaDB
+    return db.session.execute(statement, rows)
@@ -0,0 +1,257 @@
+import threading, time
+from collections import namedtuple
+import numpy as np
+from . import scoring
+from .models import Song
+
+# Audio features every emotion has a target for, scaled like scoring.feature_matrix
+INDEX_FEATURES = ('danceability', 'energy', 'loudness', 'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo')
+_COLUMNS = [scoring.FEATURE_INDEX[name] for name in INDEX_FEATURES]
+LEAF_SIZE = 32
+DELTA_SIZE = 1024  # Inserted points scanned on their own before the leaf table is rebuilt to include them
+
+LeafTable = namedtuple('LeafTable', ['points', 'ids', 'starts', 'counts', 'los', 'his'])
+
+
+class _Node:
+    __slots__ = ('lo', 'hi', 'axis', 'split', 'left', 'right', 'points', 'ids', '_array')
+
+    def __init__(self, points, ids):
+        self.points, self.ids = points, ids   # Leaf payload; None once the node is split
+        self.axis = self.split = self.left = self.right = None
+        self._array = None
+        array = np.asarray(points)
+        self.lo, self.hi = array.min(axis=0), array.max(axis=0)
+
+    @property
+    def is_leaf(self):
+        return self.points is not None
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = np.asarray(self.points)
+        return self._array
+
+    def add(self, point, item_id):
+        np.minimum(self.lo, point, out=self.lo)
+        np.maximum(self.hi, point, out=self.hi)
+        if self.is_leaf:
+            self.points.append(point)
+            self.ids.append(item_id)
+            self._array = None
+            if len(self.points) > 2 * LEAF_SIZE:
+                self.divide()
+        elif point[self.axis] < self.split:
+            self.left.add(point, item_id)
+        else:
+            self.right.add(point, item_id)
+
+    def divide(self):
+        # Split on the widest dimension at its median, recursing until leaves are small
+        array = self.array
+        axis = int(np.argmax(self.hi - self.lo))
+        split = float(np.median(array[:, axis]))
+        mask = array[:, axis] < split
+        if mask.all() or not mask.any():
+            return  # All values equal on the widest axis; keep an oversized leaf
+        ids = np.asarray(self.ids, dtype=object)
+        self.axis, self.split = axis, split
+        self.left = _Node(list(array[mask]), list(ids[mask]))
+        self.right = _Node(list(array[~mask]), list(ids[~mask]))
+        self.points = self.ids = self._array = None
+        for child in (self.left, self.right):
+            if len(child.points) > LEAF_SIZE:
+                child.divide()
+
+
+#* KD-tree over normalized audio features, answering "k tracks closest to an emotion target"
+class FeatureIndex:
+    def __init__(self, reload_interval=60):
+        self.reload_interval = reload_interval
+        self._root = None
+        self._ids = set()
+        self._table = None
+        self._delta_ids, self._delta_points = [], []  # Inserted since the leaf table was built
+        self._delta = None
+        self._max_song_id = 0
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.reload_interval = app.config.get('FEATURE_INDEX_RELOAD_INTERVAL', self.reload_interval)
+        app.extensions['feature_index'] = self
+
+    def __len__(self):
+        return len(self._ids)
+
+    @staticmethod
+    def vector(song):
+        return scoring.feature_matrix([song])[0, _COLUMNS]
+
+    @staticmethod
+    def target_box(profile):
+        # Point targets give a zero-width box, (low, high) attribute ranges a real interval
+        return profile.lower[_COLUMNS], profile.upper[_COLUMNS]
+
+    def insert(self, item_id, point):
+        point = np.asarray(point, dtype=np.float64)
+        if np.isnan(point).any():
+            return False
+        with self._lock:
+            if item_id in self._ids:
+                return False
+            if self._root is None:
+                self._root = _Node([point], [item_id])
+            else:
+                self._root.add(point, item_id)
+            self._ids.add(item_id)
+            if self._table is not None:
+                # Queries scan new points separately; the O(n) table rebuild waits for a batch of them
+                self._delta_ids.append(item_id)
+                self._delta_points.append(point)
+                self._delta = None
+                if len(self._delta_ids) > DELTA_SIZE:
+                    self._table = None
+        return True
+
+    def build(self, items):
+        # items: iterable of (item_id, point); bulk build is balanced from the start
+        ids, points = [], []
+        for item_id, point in items:
+            point = np.asarray(point, dtype=np.float64)
+            if not np.isnan(point).any():
+                ids.append(item_id)
+                points.append(point)
+        root = None
+        if points:
+            root = _Node(points, ids)
+            if len(points) > LEAF_SIZE:
+                root.divide()
+        with self._lock:
+            self._root, self._ids, self._table = root, set(ids), None
+            self._delta_ids, self._delta_points, self._delta = [], [], None
+
+    def add_songs(self, songs):
+        # Incremental insert of freshly ingested songs
+        return sum(self.insert(song.spotify_id, self.vector(song)) for song in songs)
+
+    def sync(self):
+        # First call bulk-loads the song table; later calls only read rows added since (by id)
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.reload_interval:
+            return
+        self._loaded_at = now
+        songs = Song.query.filter(Song.id > self._max_song_id).order_by(Song.id).all()
+        if not songs:
+            return
+        if self._root is None:
+            self.build((song.spotify_id, self.vector(song)) for song in songs)
+        else:
+            self.add_songs(songs)
+        self._max_song_id = songs[-1].id
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def _leaf_table(self):
+        # Caller holds the lock. Contiguous snapshot of all points grouped by leaf, with each leaf's
+        # bounding box; rebuilt only after inserts, so queries run on it without the lock
+        if self._table is None:
+            leaves, stack = [], [self._root] if self._root is not None else []
+            while stack:
+                node = stack.pop()
+                if node.is_leaf:
+                    leaves.append(node)
+                else:
+                    stack.extend((node.left, node.right))
+            width = len(INDEX_FEATURES)
+            self._table = LeafTable(
+                points=np.ascontiguousarray(np.concatenate([leaf.array for leaf in leaves]) if leaves else np.empty((0, width))),
+                ids=np.array([item_id for leaf in leaves for item_id in leaf.ids] + [None], dtype=object)[:-1],
+                starts=np.cumsum([0] + [len(leaf.ids) for leaf in leaves[:-1]], dtype=np.int64),
+                counts=np.array([len(leaf.ids) for leaf in leaves], dtype=np.int64),
+                los=np.array([leaf.lo for leaf in leaves]).reshape(len(leaves), width),
+                his=np.array([leaf.hi for leaf in leaves]).reshape(len(leaves), width)
+            )
+            self._delta_ids, self._delta_points, self._delta = [], [], None  # All in the table now
+        return self._table
+
+    def _delta_table(self):
+        # Caller holds the lock. Points inserted since the table was built, as one small array
+        if self._delta is None:
+            width = len(INDEX_FEATURES)
+            self._delta = LeafTable(
+                points=np.array(self._delta_points).reshape(len(self._delta_points), width),
+                ids=np.array(self._delta_ids + [None], dtype=object)[:-1],
+                starts=None, counts=None, los=None, his=None
+            )
+        return self._delta
+
+    def nearest(self, lower, upper, k=20, strict=False):
+        # k closest points to the target box; with strict they must also lie inside every ranged interval
+        with self._lock:
+            table, delta = self._leaf_table(), self._delta_table()
+        if k <= 0:
+            return []
+        ranged = upper > lower
+        hits = self._nearest_in_table(table, lower, upper, k, ranged, strict) if len(table.ids) else []
+        if len(delta.ids):
+            distances = self._distances(delta, np.arange(len(delta.ids)), lower, upper, ranged, strict)
+            hits += [(float(distances[i]), delta.ids[i]) for i in np.flatnonzero(np.isfinite(distances))]
+            hits = sorted(hits, key=lambda hit: hit[0])[:k]
+        return hits
+
+    def _nearest_in_table(self, table, lower, upper, k, ranged, strict):
+
+        # Lower bound per leaf in one vectorized pass
+        gap = np.maximum(np.maximum(table.los - upper, lower - table.his), 0)
+        bounds = np.einsum('ij,ij->i', gap, gap)
+        if strict:
+            bounds[~((table.his >= lower) & (table.los <= upper))[:, ranged].all(axis=1)] = np.inf
+        order = np.argsort(bounds, kind='stable')
+        order = order[np.isfinite(bounds[order])]
+
+        # Scan leaves nearest first in growing batches; after each batch the k-th distance found so
+        # far rules out every leaf whose lower bound is larger
+        visited = np.zeros(len(bounds), dtype=bool)
+        distances, rows = np.empty(0), np.empty(0, dtype=np.int64)
+        kth, budget = np.inf, 4 * k
+        while True:
+            pending = order[~visited[order] & (bounds[order] <= kth)]
+            if not len(pending):
+                break
+            batch = pending[:np.searchsorted(np.cumsum(table.counts[pending]), budget) + 1]
+            visited[batch] = True
+            batch_rows = self._rows(table, batch)
+            distances = np.concatenate((distances, self._distances(table, batch_rows, lower, upper, ranged, strict)))
+            rows = np.concatenate((rows, batch_rows))
+            finite = distances[np.isfinite(distances)]
+            if len(finite) >= k:
+                kth = np.partition(finite, k - 1)[k - 1]
+            budget *= 4
+
+        best = np.flatnonzero(np.isfinite(distances))
+        if len(best) > k:
+            best = best[np.argpartition(distances[best], k - 1)[:k]]
+        best = best[np.argsort(distances[best], kind='stable')]
+        return [(float(distances[i]), table.ids[rows[i]]) for i in best]
+
+    @staticmethod
+    def _rows(table, leaves):
+        # Row numbers of every point in the given leaves (each leaf is a contiguous run)
+        counts = table.counts[leaves]
+        return np.repeat(table.starts[leaves] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+    @staticmethod
+    def _distances(table, rows, lower, upper, ranged, strict):
+        points = table.points[rows]
+        gap = np.maximum(np.maximum(lower - points, points - upper), 0)
+        distances = np.einsum('ij,ij->i', gap, gap)
+        if strict:
+            distances[~((points >= lower) & (points <= upper))[:, ranged].all(axis=1)] = np.inf
+        return distances
+
+
+track_feature_index = FeatureIndex()
@@ -0,0 +1,80 @@
+import os, random, threading, time, zlib
+
+
+#* Genre catalog parsed from public/genres.md, shared by every request of a worker
+class GenreCatalog:
+    def __init__(self, path=None, reload_interval=60):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._genres = ()      # Tuple keeps the catalog compact and gives O(1) indexing for sampling
+        self._checksum = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.path = app.config.get('GENRES_PATH') or os.path.join(app.static_folder, 'genres.md')
+        self.reload_interval = app.config.get('GENRES_RELOAD_INTERVAL', self.reload_interval)
+        if app.config.get('GENRES_PRELOAD', True):
+            self.refresh(force=True)  # Otherwise the catalog loads on first use
+        app.extensions['genre_catalog'] = self
+
+    @staticmethod
+    def parse(text):
+        genres = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line and line[0].isdigit() and '. ' in line:
+                genres.append(line.split('. ', 1)[1])
+        return tuple(genres)
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._genres and now - self._checked_at < self.reload_interval:
+            return False
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return False
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if not force and stat_key == self._stat:
+                return False  # File untouched since the last load
+
+            with open(self.path, 'rb') as file:
+                raw = file.read()
+            self._stat = stat_key
+            checksum = zlib.crc32(raw)
+            if checksum == self._checksum:
+                return False  # Touched but identical content
+            self._genres = self.parse(raw.decode('utf-8'))
+            self._checksum = checksum
+            return True
+
+    @property
+    def genres(self):
+        self.refresh()
+        return self._genres
+
+    @property
+    def checksum(self):
+        return self._checksum
+
+    def sample(self, k):
+        genres = self.genres
+        return random.sample(genres, k=min(k, len(genres)))
+
+    def choice(self):
+        genres = self.genres
+        return genres[random.randrange(len(genres))] if genres else None
+
+    def __len__(self):
+        return len(self.genres)
+
+    def __contains__(self, genre):
+        return genre in self.genres
+
+
+genre_catalog = GenreCatalog()
@@ -0,0 +1,225 @@
+import json, threading, time, uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+from .extensions import db
+from .models import PlaylistJob
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+#* One generation job: (stage, payload) events in order, merged into the result, then done or failed
+class Job:
+    def __init__(self, owner=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.owner = owner
+        self.status = QUEUED
+        self.events = []
+        self.error = None
+        self.error_status = None
+        self.updated_at = time.monotonic()
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def result(self):
+        merged = {}
+        for _, payload in self.events:
+            merged.update(payload)
+        return merged
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stages': [stage for stage, _ in self.events],
+            'result': self.result if self.status == DONE else None,
+            'error': self.error
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(owner=row.user_id, job_id=row.id)
+        job.status, job.error, job.error_status = row.status, row.error, row.error_status
+        job.events = [tuple(event) for event in json.loads(row.events or '[]')]
+        return job
+
+
+#* In-process job pool: generation runs on a bounded executor instead of inside the HTTP request.
+# With PLAYLIST_JOB_PERSIST every state change is also written to playlist_jobs, so a status poll or
+# event stream that lands on another worker still finds the job; the work itself stays with the
+# worker that accepted it, which holds the user's Spotify client
+class JobQueue:
+    def __init__(self, name='playlist'):
+        self.name = name
+        self.max_workers = 4
+        self.max_pending = 50
+        self.ttl = 600
+        self.persist = False
+        self.poll_interval = 1.0
+        self.stream_timeout = 25
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._executor = None
+        self._last_cleanup = time.monotonic()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.max_workers = config.get('PLAYLIST_JOB_WORKERS', self.max_workers)
+        self.max_pending = config.get('PLAYLIST_JOB_MAX_PENDING', self.max_pending)
+        self.ttl = config.get('PLAYLIST_JOB_TTL', self.ttl)
+        self.persist = config.get('PLAYLIST_JOB_PERSIST', self.persist)
+        self.poll_interval = config.get('PLAYLIST_JOB_POLL_INTERVAL', self.poll_interval)
+        self.stream_timeout = config.get('PLAYLIST_JOB_STREAM_TIMEOUT', self.stream_timeout)
+        app.extensions[f'{self.name}_jobs'] = self
+
+    def submit(self, run, *args, owner=None, **kwargs):
+        # run(*args, **kwargs) yields (stage, payload) events and runs in an app context on the pool;
+        # raises QueueFull instead of queueing more than max_pending jobs
+        with self._lock:
+            self._evict()
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{self._pending} {self.name} jobs already pending")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'{self.name}-job')
+            job = Job(owner)
+            self._jobs[job.id] = job
+            self._pending += 1
+            self.submitted += 1
+            executor = self._executor
+        if self.persist:
+            try:
+                self._cleanup_rows()
+                self._save(job, created=True)
+            except Exception:
+                with self._lock:  # Never accepted: give the slot back, or failed inserts fill the queue for good
+                    self._jobs.pop(job.id, None)
+                    self._pending -= 1
+                    self.submitted -= 1
+                raise
+        executor.submit(self._run, current_app._get_current_object(), job, run, args, kwargs)
+        return job
+
+    def _run(self, app, job, run, args, kwargs):
+        with app.app_context():
+            try:
+                self._update(job, status=RUNNING)
+                for stage, payload in run(*args, **kwargs):
+                    self._update(job, event=(stage, payload))
+                self._update(job, status=DONE)
+            except Exception as e:
+                error_status = getattr(e, 'status', 500)
+                if error_status >= 500:
+                    app.logger.error(f"{self.name} job {job.id} failed: {e}")
+                self._update(job, status=FAILED, error=str(e), error_status=error_status)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if job.status == DONE:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+    def _update(self, job, status=None, event=None, error=None, error_status=None):
+        with job.changed:
+            if event is not None:
+                job.events.append(event)
+            if status is not None:
+                job.status = status
+            if error is not None:
+                job.error, job.error_status = error, error_status
+            job.updated_at = time.monotonic()
+            try:
+                if self.persist:
+                    self._save(job)  # Under the job's lock, so other workers never lag what this one reports
+            finally:
+                job.changed.notify_all()  # Local waiters see the change even when the row could not be written
+
+    def _save(self, job, created=False):
+        # Own short transaction, like the session store: never mixes with a request's ORM work
+        values = {'status': job.status, 'events': json.dumps(job.events), 'error': job.error,
+                  'error_status': job.error_status, 'updated_at': _utcnow()}
+        with db.engine.begin() as connection:
+            if created:
+                connection.execute(insert(PlaylistJob).values(id=job.id, user_id=job.owner, created_at=values['updated_at'], **values))
+            else:
+                connection.execute(update(PlaylistJob).where(PlaylistJob.id == job.id).values(**values))
+
+    def _load(self, job_id):
+        if not self.persist:
+            return None
+        with db.engine.connect() as connection:
+            row = connection.execute(select(PlaylistJob).where(PlaylistJob.id == job_id)).first()
+        return Job.from_row(row) if row else None
+
+    def get(self, job_id):
+        return self._jobs.get(job_id) or self._load(job_id)
+
+    def wait(self, job_id, since=0, timeout=None):
+        # (job, events after the first `since`), blocking up to timeout until there is something new
+        timeout = self.stream_timeout if timeout is None else timeout
+        job = self._jobs.get(job_id)
+        if job is not None:
+            with job.changed:
+                job.changed.wait_for(lambda: len(job.events) > since or job.finished, timeout)
+                return job, job.events[since:]
+        deadline = time.monotonic() + timeout
+        while True:  # Accepted by another worker: follow its row
+            job = self._load(job_id)
+            if job is None or len(job.events) > since or job.finished or time.monotonic() >= deadline:
+                return job, job.events[since:] if job else []
+            time.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+
+    def _evict(self):
+        # Finished jobs stay readable in memory for ttl seconds; called under _lock
+        expired = time.monotonic() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < expired]:
+            del self._jobs[job_id]
+
+    def _cleanup_rows(self):
+        if time.monotonic() - self._last_cleanup < self.ttl:
+            return
+        self._last_cleanup = time.monotonic()
+        with db.engine.begin() as connection:
+            connection.execute(delete(PlaylistJob).where(PlaylistJob.updated_at < _utcnow() - timedelta(seconds=self.ttl)))
+
+    def reset(self):
+        # Pool threads do not survive a fork; jobs the parent accepted are not the child's to finish
+        with self._lock:
+            self._executor = None
+            self._jobs.clear()
+            self._pending = 0
+
+    def stats(self):
+        return {
+            'workers': self.max_workers,
+            'pending': self._pending,
+            'tracked': len(self._jobs),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'persist': self.persist
+        }
+
+
+playlist_jobs = JobQueue()
@@ -0,0 +1,107 @@
+import asyncio, threading
+
+MOONSHOT_BASE_URL = "https://api.moonshot.cn/v1"
+
+
+#* Async Moonshot client: one event loop thread per worker owns the client and its connection pool.
+# Request handlers hand it coroutines, so every in-flight classification shares one loop and one pool
+class AsyncLLMClient:
+    def __init__(self):
+        self.api_key = None
+        self.connect_timeout = 3.0
+        self.read_timeout = 10.0
+        self.max_connections = 100
+        self.in_flight = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self._shared = {}  # key -> [task, waiters]; only touched on the loop thread
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.api_key = app.config.get('MOONSHOT_API_KEY')
+        self.connect_timeout = app.config.get('LLM_CONNECT_TIMEOUT', self.connect_timeout)
+        self.read_timeout = app.config.get('LLM_READ_TIMEOUT', self.read_timeout)
+        self.max_connections = app.config.get('LLM_MAX_CONNECTIONS', self.max_connections)
+        app.extensions['async_llm'] = self
+
+    def _start(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            import httpx
+            from openai import AsyncOpenAI  # Deferred to the first refinement, off the worker boot path
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='llm-event-loop', daemon=True).start()
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=MOONSHOT_BASE_URL,
+                max_retries=0,  # The caller's deadline decides, not hidden retries
+                http_client=httpx.AsyncClient(
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+                )
+            )
+            self._loop = loop
+            return loop
+
+    async def _complete(self, **kwargs):
+        self.in_flight += 1
+        try:
+            completion = await self._client.chat.completions.create(**kwargs)
+            return completion.choices[0].message.content
+        finally:
+            self.in_flight -= 1
+
+    async def _complete_shared(self, key, **kwargs):
+        # Callers with the same key await one request; it is cancelled only once every waiter has gone
+        entry = self._shared.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._complete(**kwargs))
+            entry = self._shared[key] = [task, 0]
+            task.add_done_callback(lambda _: self._shared.pop(key, None) if self._shared.get(key) is entry else None)
+        else:
+            self.coalesced += 1
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not entry[0].done():
+                entry[0].cancel()
+
+    def submit(self, key=None, **kwargs):
+        # Returns a concurrent.futures.Future; cancelling it cancels the request on the loop
+        loop = self._loop or self._start()
+        coroutine = self._complete(**kwargs) if key is None else self._complete_shared(key, **kwargs)
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    async def complete(self, timeout=None, key=None, **kwargs):
+        # Awaitable from any event loop (e.g. a Flask async view); cancelled on timeout
+        future = self.submit(key=key, **kwargs)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            future.cancel()
+            self.cancelled += 1
+            raise
+
+    def reset(self):
+        # The loop thread does not survive a fork; the child starts its own on first use
+        with self._lock:
+            self._loop = self._client = None
+            self._shared = {}
+            self.in_flight = 0
+
+    def stats(self):
+        return {
+            'started': self._loop is not None,
+            'in_flight': self.in_flight,
+            'cancelled': self.cancelled,
+            'coalesced': self.coalesced,
+            'max_connections': self.max_connections
+        }
+
+
+async_llm = AsyncLLMClient()
@@ -1,14 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app, redirect, session, url_for, render_template, send_from_directory
-from .utils import get_random_tracks, get_top_recommended_tracks, create_spotify_playlist, get_embedded_playlist_code, get_embedded_track_code, get_spotify_client
+from flask import Blueprint, Response, request, jsonify, current_app, redirect, session, url_for, render_template, send_from_directory, stream_with_context
+from .utils import playlist_stages, get_top_recommended_tracks, get_embedded_playlist_code, get_embedded_track_code, parse_track_id, get_spotify_client, search_cache, playlist_tracks_cache, spotify_flight
 from .models import Emotion, User, UserGenre, SavedTopSongsLinks
 from spotipy.oauth2 import SpotifyOAuth
 from flask_cors import CORS
-from .extensions import db
-import time, httpx
-from dotenv import load_dotenv
-from openai import OpenAI
+from .extensions import db, insert_ignore
+from .spotify import spotify_clients
+from .tokens import token_manager
+from .cache import TTLCache, SingleFlight
+from .llm import async_llm
+from .emotion_classifier import emotion_classifier
+from .emotion_labels import label_resolver
+from .resilience import llm_guard, CircuitOpenError
+from .sessions import server_sessions
+from .boot import boot_timer
+from .jobs import playlist_jobs, QueueFull
+from .warmer import warm_pools
+import asyncio, hashlib, json, threading, time
 
-load_dotenv()
 emotion_map = {
     "Joy": (0.8, 0.8),
     "Love": (0.9, 0.7),
@@ -49,14 +57,38 @@ emotion_map = {
 main = Blueprint('main', __name__)
 CORS(main, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
 
+# Moonshot classifications keyed on mainEmotion + normalized emotionDetail
+refine_cache = TTLCache(name='refine_emotion')
+refine_flight = SingleFlight(name='refine_emotion')  # Identical concurrent misses wait on one Moonshot call
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
 def init_api_client():
-    global client
-    http_client = httpx.Client(proxies=None)
-    client = OpenAI(
-        api_key=current_app.config['MOONSHOT_API_KEY'],
-        base_url="https://api.moonshot.cn/v1",
-        http_client=http_client
-    )
+    refine_cache.configure(maxsize=current_app.config.get('REFINE_CACHE_SIZE'), ttl=current_app.config.get('REFINE_CACHE_TTL'))
+    refine_flight.configure(timeout=current_app.config.get('SINGLE_FLIGHT_TIMEOUT'))
+
+def get_llm_client():
+    # Built on first use: booting a worker neither imports openai nor opens a connection pool
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                import httpx
+                from openai import OpenAI
+                timeout = httpx.Timeout(current_app.config.get('LLM_READ_TIMEOUT'), connect=current_app.config.get('LLM_CONNECT_TIMEOUT'))
+                _llm_client = OpenAI(
+                    api_key=current_app.config['MOONSHOT_API_KEY'],
+                    base_url="https://api.moonshot.cn/v1",
+                    max_retries=0,  # llm_guard owns the deadline and the hedged retry
+                    http_client=httpx.Client(proxies=None, timeout=timeout)
+                )
+    return _llm_client
+
+def reset_llm_client():
+    global _llm_client
+    with _llm_client_lock:
+        _llm_client = None
 
 
 #* DEBUGGING
@@ -67,6 +99,25 @@ def debug_env():
         'OTHER_VARIABLE': current_app.config.get('OTHER_VARIABLE')
     })
 
+@main.route('/debug-stats')
+def debug_stats():
+    return jsonify({
+        'spotify_search_cache': search_cache.stats(),
+        'spotify_playlist_tracks_cache': playlist_tracks_cache.stats(),
+        'spotify_clients': spotify_clients.stats(),
+        'tokens': token_manager.stats(),
+        'refine_emotion_cache': refine_cache.stats(),
+        'spotify_single_flight': spotify_flight.stats(),
+        'refine_single_flight': refine_flight.stats(),
+        'emotion_classifier': emotion_classifier.stats(),
+        'moonshot_resilience': llm_guard.stats(),
+        'sessions': server_sessions.stats(),
+        'playlist_jobs': playlist_jobs.stats(),
+        'warm_pools': warm_pools.stats(),
+        'boot': boot_timer.stats(),
+        'async_llm': async_llm.stats()
+    })
+
 
 #* Part 1. Login, Authentication, Get Token, Signout
 @main.route('/callback')
@@ -110,11 +161,12 @@ def callback():
     session['user_id'] = user_id
     user = User.query.filter_by(user_id=user_id).first()
     if user:
+        token_manager.store(user, token_info)
         return redirect('/emotions')  # Existing user, redirect to emotions
     else:
         new_user = User(user_id=user_id, display_name=display_name)
         db.session.add(new_user)
-        db.session.commit()
+        token_manager.store(new_user, token_info)
         return redirect('/genres-page')
 
 def check_auth():
@@ -126,20 +178,12 @@ def get_token():
     token_info = session.get('token_info')
     if not token_info:
         return None
-    now = int(time.time())
-    is_expired = token_info['expires_at'] - now < 1440
-    
-    if is_expired:
-        sp_oauth = SpotifyOAuth(
-            client_id=current_app.config('SPOTIFY_CLIENT_ID'),
-            client_secret=current_app.config('SPOTIFY_CLIENT_SECRET'),
-            redirect_uri=current_app.config('SPOTIFY_REDIRECT_URI'),
-            scope=current_app.config('SPOTIFY_SCOPES'),
-            cache_handler=None
-        )
-        token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
-        session['token_info'] = token_info
-    return token_info['access_token']
+
+    # Tokens are refreshed ahead of expiry in the background; only a nearly expired one blocks here
+    fresh_token_info = token_manager.get_token_info(session.get('user_id'), token_info)
+    if fresh_token_info and fresh_token_info['access_token'] != token_info['access_token']:
+        session['token_info'] = {**token_info, **fresh_token_info}
+    return (fresh_token_info or token_info)['access_token']
 
 @main.route('/login')
 def login():
@@ -204,6 +248,50 @@ def genres_page():
 
 
 #* Route for understanding and pinpointing the user's emotion
+REFINE_SYSTEM_PROMPT = "你是 Kimi，由 Moonshot AI 提供的人工智能助手，你更擅长中文和英文的对话。你会为用户提供安全，有帮助，准确的回答。同时，你会拒绝一切涉及恐怖主义，种族歧视，黄色暴力等问题的回答。Moonshot AI 为专有名词，不可翻译成其他语言。"
+
+def build_refine_messages(main_emotion, emotion_detail):
+    prompt = f"""请根据以下描述细化情感，并在以下情感列表中选择最匹配的情感，仅回复情感名称：
+        情感描述: "{emotion_detail}"
+        主要情感: "{main_emotion}"
+        情感列表: Joy, Love, Devotion, Tender feelings, Suffering, Weeping, High spirits, Low spirits, Anxiety, Grief, Dejection, Despair, Anger, Hatred, Disdain, Contempt, Disgust, Guilt, Pride, Helplessness, Patience, Affirmation, Negation, Surprise, Fear, Self-attention, Shyness, Modesty, Blushing, Reflection, Meditation, Ill-temper, Sulkiness, Determination.
+    """
+    return [
+        {"role": "system", "content": REFINE_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def refine_cache_key(main_emotion, emotion_detail):
+    # Case-folded and whitespace-collapsed, so trivially different texts share an entry
+    normalized = ' '.join(emotion_detail.casefold().split())
+    return hashlib.sha256(f"{main_emotion.casefold().strip()}\x1f{normalized}".encode('utf-8')).hexdigest()
+
+def refine_completion_kwargs(main_emotion, emotion_detail):
+    return dict(
+        model = "moonshot-v1-8k",
+        messages = build_refine_messages(main_emotion, emotion_detail),
+        temperature = 0.3,
+        max_tokens=20
+    )
+
+def request_refinement(llm, main_emotion, emotion_detail):
+    # Runs on llm_guard's pool, outside the app context: the client is resolved by the caller
+    completion = llm.chat.completions.create(**refine_completion_kwargs(main_emotion, emotion_detail))
+    return completion.choices[0].message.content
+
+def remember_refinement(cache_key, refined, main_emotion):
+    # Snap the model's answer onto a canonical label; only confident answers are cached, anything
+    # unrecognizable falls back to the main emotion instead of reaching create_playlist as-is
+    label = label_resolver.canonical(refined)
+    if label is None:
+        current_app.logger.warning(f"Unrecognized emotion refinement: {refined!r}")
+        return fallback_emotion(main_emotion)
+    refine_cache.set(cache_key, label)
+    return label
+
+def fallback_emotion(main_emotion):
+    return label_resolver.canonical(main_emotion, default=main_emotion)
+
 @main.route('/api/refineEmotion', methods=['POST'])
 def refine_emotion():
     try:
@@ -212,24 +300,58 @@ def refine_emotion():
         if not main_emotion:
             return jsonify({'error': 'Main emotion is required'}), 400
         if emotion_detail and emotion_detail.strip():
-            prompt = f"""请根据以下描述细化情感，并在以下情感列表中选择最匹配的情感，仅回复情感名称：
-                情感描述: "{emotion_detail}"
-                主要情感: "{main_emotion}"
-                情感列表: Joy, Love, Devotion, Tender feelings, Suffering, Weeping, High spirits, Low spirits, Anxiety, Grief, Dejection, Despair, Anger, Hatred, Disdain, Contempt, Disgust, Guilt, Pride, Helplessness, Patience, Affirmation, Negation, Surprise, Fear, Self-attention, Shyness, Modesty, Blushing, Reflection, Meditation, Ill-temper, Sulkiness, Determination.
-            """
-            completion = client.chat.completions.create(
-                model = "moonshot-v1-8k",
-                messages = [
-                    {"role": "system", "content": "你是 Kimi，由 Moonshot AI 提供的人工智能助手，你更擅长中文和英文的对话。你会为用户提供安全，有帮助，准确的回答。同时，你会拒绝一切涉及恐怖主义，种族歧视，黄色暴力等问题的回答。Moonshot AI 为专有名词，不可翻译成其他语言。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature = 0.3,
-                max_tokens=20
-            )
-            refine_emotion = completion.choices[0].message.content
+            refine_emotion = emotion_classifier.resolve(emotion_detail)
+            if refine_emotion is not None:
+                return jsonify({'refinedEmotion': refine_emotion})
+            cache_key = refine_cache_key(main_emotion, emotion_detail)
+            refine_emotion = refine_cache.get(cache_key)
+            if refine_emotion is None:
+                llm = get_llm_client()
+                refine_emotion = refine_flight.do(cache_key, lambda: llm_guard.call(lambda: request_refinement(llm, main_emotion, emotion_detail)))
+                refine_emotion = remember_refinement(cache_key, refine_emotion, main_emotion)
             return jsonify({'refinedEmotion': refine_emotion})
         else:
             return jsonify({'emotion': main_emotion})
+    except CircuitOpenError:
+        # Moonshot is failing or too slow right now; the main emotion still makes a fitting playlist
+        return jsonify({'refinedEmotion': fallback_emotion(main_emotion)})
+    except TimeoutError:
+        current_app.logger.warning("Emotion refinement timed out")
+        return jsonify({'error': 'Emotion refinement timed out'}), 504
+    except Exception as error:
+        print(f"Error refining emotion: {error}")
+        return jsonify({'error': 'Failed to refine emotion'}), 500
+
+# Same contract as /api/refineEmotion, but the Moonshot call runs on the shared async client, so a
+# slow answer only holds a coroutine and is cancelled once LLM_REQUEST_TIMEOUT passes
+@main.route('/api/refineEmotion/async', methods=['POST'])
+async def refine_emotion_async():
+    try:
+        data = request.get_json()
+        main_emotion, emotion_detail = data.get('mainEmotion'), data.get('emotionDetail')
+        if not main_emotion:
+            return jsonify({'error': 'Main emotion is required'}), 400
+        if emotion_detail and emotion_detail.strip():
+            refine_emotion = emotion_classifier.resolve(emotion_detail)
+            if refine_emotion is not None:
+                return jsonify({'refinedEmotion': refine_emotion})
+            cache_key = refine_cache_key(main_emotion, emotion_detail)
+            refine_emotion = refine_cache.get(cache_key)
+            if refine_emotion is None:
+                refine_emotion = await llm_guard.acall(lambda: async_llm.complete(
+                    timeout=current_app.config.get('LLM_REQUEST_TIMEOUT'),
+                    key=cache_key,
+                    **refine_completion_kwargs(main_emotion, emotion_detail)
+                ))
+                refine_emotion = remember_refinement(cache_key, refine_emotion, main_emotion)
+            return jsonify({'refinedEmotion': refine_emotion})
+        else:
+            return jsonify({'emotion': main_emotion})
+    except CircuitOpenError:
+        return jsonify({'refinedEmotion': fallback_emotion(main_emotion)})
+    except asyncio.TimeoutError:
+        current_app.logger.warning("Emotion refinement timed out")
+        return jsonify({'error': 'Emotion refinement timed out'}), 504
     except Exception as error:
         print(f"Error refining emotion: {error}")
         return jsonify({'error': 'Failed to refine emotion'}), 500
@@ -242,7 +364,7 @@ TODO: Update the API + recommendations.html (for using the API) for recommendati
 
 #* Part 3. Functions for creating tailored playlist
 def classify_emotion(emotion):
-    valence, arousal = emotion_map.get(emotion, (0, 0))
+    valence, arousal = emotion_map.get(label_resolver.canonical(emotion, default=emotion), (0, 0))
     if valence >= 0.67 and arousal >= 0.67:
         return "JOY"  # High Valence, High Arousal
     elif valence >= 0.67 and arousal < 0.67:
@@ -252,6 +374,36 @@ def classify_emotion(emotion):
     else:
         return "SADNESS"  # Low Valence, Low Arousal
 
+class PlaylistError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.status = status
+
+def create_playlist_events(emotion_text, **context):
+    # The create_playlist pipeline as (stage, JSON payload) events: emotion, candidates, playlist, top_tracks.
+    # Shared by the JSON, streaming and job endpoints; context is passed through to utils.playlist_stages
+    emotion, confidence = label_resolver.resolve(emotion_text)
+    current_app.logger.info(f"Received emotion: {emotion_text!r} -> {emotion} ({confidence})")
+    if emotion is None or confidence < label_resolver.min_confidence:
+        raise PlaylistError('Invalid emotion', 400)
+    emotion_key = classify_emotion(emotion)
+    if emotion_key not in Emotion.__members__:
+        raise PlaylistError('Invalid emotion', 400)
+    yield 'emotion', {'emotion': emotion, 'emotion_key': emotion_key}
+
+    stage = None
+    for stage, value in playlist_stages(Emotion[emotion_key], **context):
+        if stage == 'candidates':
+            yield stage, {'candidates': len(value)}
+        elif stage == 'playlist':
+            yield stage, {'playlist_id': value, 'embedded_playlist_code': get_embedded_playlist_code(value)}
+        else:
+            yield stage, {'top_tracks_embedded': [get_embedded_track_code(track.spotify_id) for track in value]}
+    if stage is None:
+        raise PlaylistError(f'No tracks found for emotion: {emotion_key}', 404)
+    if stage == 'candidates':
+        raise PlaylistError('Failed to create Spotify playlist', 500)
+
 @main.route('/api/create_playlist', methods=['POST'])
 def create_playlist():
     auth_check = check_auth()
@@ -273,47 +425,124 @@ def create_playlist():
         raise Exception("Spotify client not authenticated")
     
     try:
-        # 1. Retrieve emotion from request
-        data = request.json
-        emotion = data.get('emotion')
-        emotion = emotion.capitalize()
-        current_app.logger.info(f'Received emotion: {emotion}')
-
-        # 2. Classify emotion + Debug
-        emotion_key = classify_emotion(emotion)
-        if emotion_key not in Emotion.__members__:
-            print(f"Invalid emotion key: {emotion_key}")
-            return jsonify({'error': 'Invalid emotion'}), 400
-
-        # 3. Get random tracks based on emotion
-        emotion_enum = Emotion[emotion_key]
-        tracks = get_random_tracks(emotion_enum)
-        if not tracks:
-            return jsonify({'error': f'No tracks found for emotion: {emotion_key}'}), 404
-
-        # 4. Create Spotify playlist
-        spotify_playlist_id = create_spotify_playlist(tracks)
-        if not spotify_playlist_id:
-            return jsonify({'error': 'Failed to create Spotify playlist'}), 500
-        
-        # 5. Get embedded playlist code
-        embedded_playlist_code = get_embedded_playlist_code(spotify_playlist_id)
-        current_app.logger.info(f"Embedded playlist code: {embedded_playlist_code}")
-        
-        # 6. Get top recommended tracks
-        top_tracks = get_top_recommended_tracks(spotify_playlist_id)
-        if not top_tracks:
-            top_tracks = []
-        top_tracks_embedded = [get_embedded_track_code(track.spotify_id) for track in top_tracks]
-
+        # Emotion -> candidates -> Spotify playlist -> top tracks (ranked from the tracks already in hand)
+        result = {}
+        for stage, payload in create_playlist_events(request.json.get('emotion'), sp=sp):
+            result.update(payload)
+        current_app.logger.info(f"Created playlist {result['playlist_id']}")
         return jsonify({
-            'embedded_playlist_code': embedded_playlist_code,
-            'top_tracks_embedded': top_tracks_embedded
+            'embedded_playlist_code': result['embedded_playlist_code'],
+            'top_tracks_embedded': result['top_tracks_embedded']
         })
-    
+
+    except PlaylistError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         current_app.logger.error(f"Error in create_playlist: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+
+# Streaming variant: one NDJSON line per finished stage, so the playlist embed renders before the top tracks
+@main.route('/api/create_playlist/stream', methods=['POST'])
+def create_playlist_stream():
+    auth_check = check_auth()
+    if auth_check:
+        return auth_check
+    access_token = get_token()
+    if not access_token:
+        return redirect(url_for('main.login'))
+
+    events = create_playlist_events((request.get_json(silent=True) or {}).get('emotion'), sp=get_spotify_client(access_token))
+    try:
+        first = next(events)  # An invalid emotion still gets a plain 400 instead of a 200 stream
+    except PlaylistError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    def stream():
+        yield json.dumps({'stage': first[0], **first[1]}) + "\n"
+        try:
+            for stage, payload in events:
+                yield json.dumps({'stage': stage, **payload}) + "\n"
+        except Exception as e:
+            # Headers are already sent: the failure becomes the last line
+            current_app.logger.error(f"Error in create_playlist_stream: {str(e)}")
+            yield json.dumps({'stage': 'error', 'error': str(e), 'status': getattr(e, 'status', 500)}) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Job mode: enqueue and answer 202 at once; the page follows the job's stages over SSE or by polling
+@main.route('/api/playlist_jobs', methods=['POST'])
+def enqueue_playlist_job():
+    auth_check = check_auth()
+    if auth_check:
+        return auth_check
+    access_token = get_token()
+    if not access_token:
+        return redirect(url_for('main.login'))
+
+    data = request.get_json(silent=True) or {}
+    try:
+        # The job runs outside this request, so it gets the client and the session's values up front
+        job = playlist_jobs.submit(
+            create_playlist_events, data.get('emotion'),
+            owner=session.get('user_id'),
+            sp=get_spotify_client(access_token),
+            user_id=session.get('user_id'),
+            user_genres=session.get('selectedGenres', [])
+        )
+    except QueueFull:
+        return jsonify({'error': 'Too many playlists are being generated, please retry shortly'}), 503, {'Retry-After': '5'}
+
+    status_url = url_for('main.playlist_job_status', job_id=job.id)
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': status_url,
+        'events_url': url_for('main.playlist_job_events', job_id=job.id)
+    }), 202, {'Location': status_url}
+
+def get_playlist_job(job_id):
+    job = playlist_jobs.get(job_id)
+    return job if job is not None and job.owner == session.get('user_id') else None
+
+@main.route('/api/playlist_jobs/<string:job_id>', methods=['GET'])
+def playlist_job_status(job_id):
+    job = get_playlist_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@main.route('/api/playlist_jobs/<string:job_id>/events', methods=['GET'])
+def playlist_job_events(job_id):
+    job = get_playlist_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # Event ids count stages, so a reconnecting EventSource resumes after the last one it saw
+    since = request.headers.get('Last-Event-ID', default=0, type=int)
+
+    def stream():
+        nonlocal since
+        deadline = time.monotonic() + playlist_jobs.stream_timeout
+        yield "retry: 1000\n\n"
+        while True:
+            current, events = playlist_jobs.wait(job_id, since, timeout=max(deadline - time.monotonic(), 0))
+            if current is None:
+                return
+            for stage, payload in events:
+                since += 1
+                yield f"id: {since}\nevent: stage\ndata: {json.dumps({'stage': stage, **payload})}\n\n"
+            if current.finished and since >= len(current.events):
+                yield f"event: {current.status}\ndata: {json.dumps({**current.to_dict(), 'error_status': current.error_status})}\n\n"
+                return
+            if time.monotonic() >= deadline:
+                return  # Bounded connection; the browser reconnects with Last-Event-ID
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
 
 #* Part 4. Function for recommending tailored top 5 tracks to the users
@@ -347,7 +576,7 @@ def get_user_genres():
     if not user_id:
         return jsonify({'error': 'User not logged in'}), 403
 
-    genres = UserGenre.query.filter_by(user_id=user_id).all()
+    genres = UserGenre.query.filter_by(user_id=user_id).order_by(UserGenre.id).all()  # Selection order
     genre_list = [genre.genre for genre in genres]
     return jsonify({'genres': genre_list})
 
@@ -358,18 +587,19 @@ def update_genres():
         return jsonify({'error': 'User not logged in'}), 403
     
     data = request.get_json()
-    selected_genres = data.get('genres', [])
-    UserGenre.query.filter_by(user_id=user_id).delete()  # Delete old genres for the user
-
-    # Add new genres
-    for genre in selected_genres:
-        new_genre = UserGenre(user_id=user_id, genre=genre)
-        db.session.add(new_genre)
-    
-    db.session.commit()
+    selected_genres = list(dict.fromkeys(genre for genre in data.get('genres', []) if genre))
     try:
+        # Only touch what changed: one bulk DELETE for deselected genres, one multi-row INSERT for new ones
+        current = {row.genre for row in UserGenre.query.with_entities(UserGenre.genre).filter_by(user_id=user_id)}
+        removed = current.difference(selected_genres)
+        added = [genre for genre in selected_genres if genre not in current]
+        if removed:
+            UserGenre.query.filter(UserGenre.user_id == user_id, UserGenre.genre.in_(removed)).delete(synchronize_session=False)
+        insert_ignore(UserGenre, [{'user_id': user_id, 'genre': genre} for genre in added], ['user_id', 'genre'])
+        db.session.commit()
         return jsonify({"success": True}), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
     
 
@@ -377,33 +607,87 @@ def update_genres():
 @main.route('/api/save_top_song', methods=['POST'])
 def save_top_song():
     user_id = session.get('user_id')
-    song_link = request.json.get('link').strip()  # Ensure the input is stripped of leading/trailing whitespace
     if not user_id:
         return jsonify({'error': 'Failed to retrieve Spotify user ID'}), 500
 
-    try:
-        if "<iframe" in song_link:
-            start = song_link.find("src=\"") + 5
-            end = song_link.find("\"", start)
-            song_link = song_link[start:end]
-        track_id = song_link.split("/track/")[-1].split("?")[0]   # Further split to get the track ID
-    except IndexError:
+    track_id = parse_track_id(request.json.get('link'))
+    if not track_id:
         return jsonify({'error': 'Invalid song link format'}), 400
 
-    embed_url = f"https://open.spotify.com/embed/track/{track_id}?utm_source=generator"  # Generate the correctly formatted embed URL
-    new_song = SavedTopSongsLinks(user_id=user_id, top_songs_links=embed_url)
-    db.session.add(new_song)
+    # Only the bare track id is stored; saving a track twice is an idempotent no-op
+    insert_ignore(SavedTopSongsLinks, [{'user_id': user_id, 'track_id': track_id}], ['user_id', 'track_id'])
     db.session.commit()
 
     return jsonify({'message': 'Song saved successfully!'}), 201
 
 
+# Save many tracks at once: {"links": [<iframe, link, URI or track id>, ...]}. One SELECT of what the
+# user already has, one multi-row INSERT, one commit, and a result per item in request order
+@main.route('/api/save_top_songs', methods=['POST'])
+def save_top_songs():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Failed to retrieve Spotify user ID'}), 500
+
+    links = (request.get_json(silent=True) or {}).get('links')
+    if not isinstance(links, list) or not links:
+        return jsonify({'error': 'links must be a non-empty list'}), 400
+    if len(links) > current_app.config['MAX_TOP_SONGS_BATCH']:
+        return jsonify({'error': f"At most {current_app.config['MAX_TOP_SONGS_BATCH']} links per request"}), 400
+
+    track_ids = [parse_track_id(link) for link in links]
+    wanted = {track_id for track_id in track_ids if track_id}
+    existing = {row.track_id for row in SavedTopSongsLinks.query.with_entities(SavedTopSongsLinks.track_id)
+                .filter(SavedTopSongsLinks.user_id == user_id, SavedTopSongsLinks.track_id.in_(wanted))} if wanted else set()
+
+    results, new_rows = [], {}
+    for link, track_id in zip(links, track_ids):
+        if not track_id:
+            status = 'invalid'
+        elif track_id in existing:
+            status = 'already_saved'
+        elif track_id in new_rows:
+            status = 'duplicate'
+        else:
+            status = 'saved'
+            new_rows[track_id] = {'user_id': user_id, 'track_id': track_id}
+        results.append({'track_id': track_id, 'status': status})
+
+    try:
+        insert_ignore(SavedTopSongsLinks, list(new_rows.values()), ['user_id', 'track_id'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error saving tracks: {e}")
+        return jsonify({'error': 'Failed to save tracks'}), 500
+    return jsonify({'saved': len(new_rows), 'results': results}), 201 if new_rows else 200
+
+
 @main.route('/api/get_saved_tracks', methods=['GET'])
 def get_saved_tracks():
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"error": "User not logged in"}), 401
 
-    tracks = SavedTopSongsLinks.query.filter_by(user_id=user_id).all()
-    track_data = [{"track_link": t.top_songs_links} for t in tracks]
-    return jsonify(track_data), 200
+    # Keyset pagination: ?cursor=<id of the last track seen>; the next cursor comes back in X-Next-Cursor
+    limit = min(request.args.get('limit', current_app.config['SONGS_PER_PAGE'], type=int), current_app.config['MAX_SONGS_PER_PAGE'])
+    cursor = request.args.get('cursor', 0, type=int)
+    if limit <= 0 or cursor < 0:
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+
+    tracks = (SavedTopSongsLinks.query
+              .filter(SavedTopSongsLinks.user_id == user_id, SavedTopSongsLinks.id > cursor)
+              .order_by(SavedTopSongsLinks.id)
+              .limit(limit + 1)
+              .all())
+    page = tracks[:limit]
+    track_data = [{"track_id": t.track_id, "track_link": t.embed_url} for t in page]
+
+    response = jsonify(track_data)
+    if len(tracks) > limit:
+        response.headers['X-Next-Cursor'] = str(page[-1].id)
+        response.headers['Link'] = f'<{url_for("main.get_saved_tracks", cursor=page[-1].id, limit=limit)}>; rel="next"'
+    # Revalidation with If-None-Match answers 304 without a body when the page has not changed
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
@@ -15,8 +15,8 @@ class User(db.Model):
     user_id = db.Column(db.String(100), unique=True, nullable=False)
     display_name = db.Column(db.String(100)) # Add this line
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
-    access_token = db.Column(db.String(255))
-    refresh_token = db.Column(db.String(255))
+    access_token = db.Column(db.Text)
+    refresh_token = db.Column(db.Text)
     expires_at = db.Column(db.Integer)
     genres = db.relationship('UserGenre', backref='user', lazy=True)
 
@@ -25,12 +25,19 @@ class User(db.Model):
         self.display_name = display_name # Add this line
 
 class Song(db.Model):
+    # Local catalog lookups filter on emotion (and genre) and match on the key audio features
+    __table_args__ = (
+        db.Index('ix_song_emotion_genre', 'emotion', 'genre'),
+        db.Index('ix_song_emotion_valence_energy', 'emotion', 'valence', 'energy'),
+        db.Index('ix_song_emotion_danceability_tempo', 'emotion', 'danceability', 'tempo'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     artist = db.Column(db.String(100), nullable=False)
     album = db.Column(db.String(100))
     spotify_id = db.Column(db.String(100), unique=True, nullable=False)
     emotion = db.Column(db.Enum(Emotion), nullable=False)
+    genre = db.Column(db.String(100))
     danceability = db.Column(db.Float, nullable=False)
     energy = db.Column(db.Float, nullable=False)
     key = db.Column(db.String(10), nullable=False)
@@ -53,6 +60,8 @@ class Playlist(db.Model):
 
 class UserGenre(db.Model):
     __tablename__ = 'user_genres'
+    # One row per (user, genre); the constraint's index also serves lookups by user_id alone
+    __table_args__ = (db.UniqueConstraint('user_id', 'genre', name='uq_user_genres_user_id_genre'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String, db.ForeignKey('users.user_id'), nullable=False)
     genre = db.Column(db.String, nullable=False)
@@ -63,13 +72,40 @@ class UserGenre(db.Model):
 
 class SavedTopSongsLinks(db.Model):
     __tablename__ = 'saved_top_songs_links'
+    # Saving the same track twice is a no-op; the constraint's index also serves per-user pages
+    __table_args__ = (db.UniqueConstraint('user_id', 'track_id', name='uq_saved_top_songs_links_user_id_track_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String, db.ForeignKey('users.user_id'), nullable=False)
-    top_songs_links = db.Column(db.Text, nullable=False)
+    track_id = db.Column(db.String(64), nullable=False)  # Bare Spotify track id
 
-    def __init__(self, user_id, top_songs_links):
+    def __init__(self, user_id, track_id):
         self.user_id = user_id
-        self.top_songs_links = top_songs_links
+        self.track_id = track_id
+
+    @property
+    def embed_url(self):
+        return f"https://open.spotify.com/embed/track/{self.track_id}?utm_source=generator"
+
+class ServerSession(db.Model):
+    # Server-side session store (app/sessions.py); Flask-Session's SQLAlchemy table plus a write version
+    __tablename__ = 'sessions'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(255), unique=True)
+    data = db.Column(db.LargeBinary)
+    expiry = db.Column(db.DateTime, index=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Bumped by every write
+
+class PlaylistJob(db.Model):
+    # Background playlist generation (app/jobs.py), readable from every worker while it runs
+    __tablename__ = 'playlist_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.String(100), index=True)
+    status = db.Column(db.String(16), nullable=False)
+    events = db.Column(db.Text)                  # JSON [[stage, payload], ...]
+    error = db.Column(db.Text)
+    error_status = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, index=True)
 
 # Playlist-Songs
 playlist_songs = db.Table('playlist_songs',
@@ -0,0 +1,257 @@
+import threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class CircuitOpenError(Exception):
+    pass
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def is_upstream_failure(error):
+    # Timeouts, dropped connections, 429 and 5xx say the upstream is unhealthy. A 4xx (e.g. Moonshot's content
+    # filter answering BadRequestError) is about this request: no retry, no hedge, nothing held against the breaker
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+#* Circuit breaker: opens after N consecutive failures or SLO breaches, lets one probe through after a cool-down
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, latency_slo=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_slo = latency_slo  # seconds; a success slower than this counts against the upstream
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self._probing):
+                self._probing = self.state == self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency):
+        if self.latency_slo is not None and latency > self.latency_slo:
+            return self.record_failure()
+        with self._lock:
+            self.state, self.consecutive_failures, self._probing = self.CLOSED, 0, False
+
+    def release_probe(self):
+        # The admitted call never reached a verdict (queued out, cancelled, refused as a bad request):
+        # let the next call probe instead of staying half-open forever
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state, self._opened_at, self._probing = self.OPEN, time.monotonic(), False
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'opened': self.opened,
+            'rejected': self.rejected
+        }
+
+
+#* Rolling latency window, the source of the hedging delay
+class LatencyWindow:
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()  # Request threads append while others sort
+
+    def add(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, q, min_samples=1):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+#* Deadline + breaker + hedged retry around a blocking upstream call
+class ResilientCaller:
+    def __init__(self, name=None):
+        self.name = name
+        self.deadline = 12.0
+        self.hedge_enabled = True
+        self.hedge_percentile = 0.95
+        self.hedge_min_samples = 20
+        self.hedge_min_delay = 0.5
+        self.max_workers = 16  # Every sync call runs on this pool, so it bounds this worker's concurrent upstream calls
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyWindow()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+        self.queue_timeouts = 0
+        self.client_errors = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, prefix='LLM'):
+        config = lambda key, default: app.config.get(f'{prefix}_{key}', default)
+        self.deadline = config('REQUEST_TIMEOUT', self.deadline)
+        self.hedge_enabled = config('HEDGE_ENABLED', self.hedge_enabled)
+        self.hedge_percentile = config('HEDGE_PERCENTILE', self.hedge_percentile)
+        self.hedge_min_samples = config('HEDGE_MIN_SAMPLES', self.hedge_min_samples)
+        self.hedge_min_delay = config('HEDGE_MIN_DELAY', self.hedge_min_delay)
+        self.max_workers = config('CALL_WORKERS', self.max_workers)
+        self.breaker.failure_threshold = config('BREAKER_FAILURES', self.breaker.failure_threshold)
+        self.breaker.reset_timeout = config('BREAKER_RESET_TIMEOUT', self.breaker.reset_timeout)
+        self.breaker.latency_slo = config('LATENCY_SLO', self.breaker.latency_slo)
+        app.extensions[f'{self.name or prefix.lower()}_resilience'] = self
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f'{self.name or "upstream"}-call')
+            return self._executor
+
+    def hedge_delay(self):
+        # Fire a second attempt once the first has run longer than the recent p95
+        if not self.hedge_enabled:
+            return None
+        p = self.latency.percentile(self.hedge_percentile, self.hedge_min_samples)
+        return None if p is None else max(p, self.hedge_min_delay)
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name or 'upstream'} circuit is open")
+        self._count('calls')
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _succeeded(self, latency):
+        self.latency.add(latency)
+        self.breaker.record_success(latency)
+
+    @staticmethod
+    def _timed(fn, starts):
+        # Latency counts from when a pool thread picks the attempt up, not from when it was queued
+        started = time.monotonic()
+        starts.append(started)
+        return fn(), time.monotonic() - started
+
+    def call(self, fn, deadline=None):
+        self._admit()
+        start = time.monotonic()
+        deadline_at = start + (self.deadline if deadline is None else deadline)
+        executor = self._get_executor()
+        starts = []
+        attempts = [executor.submit(self._timed, fn, starts)]
+        pending = set(attempts)
+        hedge_at = self.hedge_delay()
+        error = None
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline_at:
+                    break
+                # The hedge clock starts with the first attempt; while it is still queued, look again shortly
+                hedge_due = None if hedge_at is None or len(attempts) > 1 else (starts[0] if starts else now) + hedge_at
+                wake = deadline_at if hedge_due is None else min(deadline_at, hedge_due)
+                done, pending = wait(pending, timeout=wake - now, return_when=FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        result, latency = attempt.result()
+                        self._count('hedge_wins', attempt is not attempts[0])
+                        self._succeeded(latency)
+                        return result
+                    error = attempt.exception()
+                    if not is_upstream_failure(error):
+                        self._count('client_errors')
+                        self.breaker.release_probe()
+                        raise error
+                hedge_now = len(attempts) == 1 and hedge_at is not None and (not pending or (starts and time.monotonic() >= starts[0] + hedge_at))
+                if hedge_now:
+                    # Also the retry when the first attempt failed before the hedge delay
+                    attempts.append(executor.submit(self._timed, fn, starts))
+                    pending.add(attempts[-1])
+                    self._count('hedged')
+                elif not pending:
+                    break
+        finally:
+            for attempt in pending:
+                attempt.cancel()  # Only stops attempts still queued; running ones end on the client timeouts
+
+        if not starts:
+            # Never left this worker's queue: local saturation, not a verdict on the upstream
+            self._count('queue_timeouts')
+            self.breaker.release_probe()
+            raise DeadlineExceeded(f"{self.name or 'upstream'} call waited {deadline_at - start:.1f}s for a free call slot")
+        self.breaker.record_failure()
+        if error is not None and not pending:
+            raise error
+        self._count('deadlines_exceeded')
+        raise DeadlineExceeded(f"{self.name or 'upstream'} call exceeded its {deadline_at - start:.1f}s deadline")
+
+    async def acall(self, make_awaitable):
+        # Breaker bookkeeping for an awaitable that enforces its own deadline (async_llm.complete)
+        self._admit()
+        start = time.monotonic()
+        try:
+            result = await make_awaitable()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.breaker.record_failure()
+            else:
+                self._count('client_errors')
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            self.breaker.release_probe()  # Cancelled (client went away): no verdict on the upstream
+            raise
+        self._succeeded(time.monotonic() - start)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._executor = None
+
+    def stats(self):
+        p95 = self.latency.percentile(0.95)
+        return {
+            **self.breaker.stats(),
+            'calls': self.calls,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'deadlines_exceeded': self.deadlines_exceeded,
+            'queue_timeouts': self.queue_timeouts,
+            'client_errors': self.client_errors,
+            'call_workers': self.max_workers,
+            'p95_latency': round(p95, 3) if p95 is not None else None,
+            'hedge_delay': self.hedge_delay()
+        }
+
+
+llm_guard = ResilientCaller(name='moonshot')
@@ -0,0 +1,91 @@
+from collections import namedtuple
+import numpy as np
+
+# Column order of the feature matrix; every column is scaled to roughly [0, 1]
+FEATURES = ('danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+            'instrumentalness', 'liveness', 'valence', 'tempo', 'popularity')
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+_OFFSET = np.array([0, 0, 60, 0, 0, 0, 0, 0, 0, 0], dtype=np.float64)     # loudness: -60..0 dB
+_SCALE = np.array([1, 1, 60, 1, 1, 1, 1, 1, 250, 100], dtype=np.float64)  # tempo: BPM, popularity: 0..100
+NEUTRAL = 0.5  # Stand-in score component for a feature the track has no value for
+
+# Weights are applied to the scaled features (higher is better unless the profile has a target range)
+DEFAULT_WEIGHTS = {
+    'danceability': 0.1,
+    'energy': 0.1,
+    'loudness': 0.05,
+    'speechiness': 0.05,
+    'acousticness': 0.1,
+    'instrumentalness': 0.1,
+    'liveness': 0.05,
+    'valence': 0.1,
+    'tempo': 0.05,
+    'popularity': 0.3  # Give more weight to popularity
+}
+
+# How much matching each emotion target counts; popularity stays a plain "higher is better" term
+EMOTION_TARGET_WEIGHTS = {
+    'danceability': 0.15,
+    'energy': 0.15,
+    'valence': 0.15,
+    'acousticness': 0.1,
+    'loudness': 0.05,
+    'tempo': 0.05,
+    'instrumentalness': 0.05,
+    'liveness': 0.05,
+    'popularity': 0.25
+}
+
+# weights: (d,) vector; lower/upper: (d,) target interval per feature, NaN where there is no target
+ScoringProfile = namedtuple('ScoringProfile', ['weights', 'lower', 'upper'])
+
+
+def scale(values):
+    return (np.asarray(values, dtype=np.float64) + _OFFSET) / _SCALE
+
+def weight_vector(weights):
+    vector = np.zeros(len(FEATURES))
+    for name, weight in weights.items():
+        vector[FEATURE_INDEX[name]] = weight
+    return vector
+
+def default_profile(weights=None):
+    nan = np.full(len(FEATURES), np.nan)
+    return ScoringProfile(weight_vector(weights or DEFAULT_WEIGHTS), nan, nan.copy())
+
+def emotion_profile(attributes, weights=None):
+    # attributes: one entry of utils.emotion_to_attributes; tuples are ranges, scalars point targets
+    lower = np.full(len(FEATURES), np.nan)
+    upper = np.full(len(FEATURES), np.nan)
+    for name, target in attributes.items():
+        name = 'valence' if name == 'valence_range' else name
+        if name not in FEATURE_INDEX:
+            continue  # mode / time_signature are not scored
+        low, high = target if isinstance(target, tuple) else (target, target)
+        lower[FEATURE_INDEX[name]], upper[FEATURE_INDEX[name]] = low, high
+    return ScoringProfile(weight_vector(weights or EMOTION_TARGET_WEIGHTS), scale(lower), scale(upper))
+
+
+#* Pack a candidate set into one contiguous (n, d) matrix; missing features become NaN
+def feature_matrix(tracks):
+    raw = np.array([[getattr(track, name, None) for name in FEATURES] for track in tracks], dtype=np.float64).reshape(len(tracks), len(FEATURES))
+    return np.ascontiguousarray(scale(raw))
+
+def score_matrix(matrix, profile):
+    targeted = ~np.isnan(profile.lower)
+    # Distance to the target interval (0 inside it) turned into a closeness in [0, 1]
+    distance = np.maximum(np.maximum(profile.lower - matrix, matrix - profile.upper), 0)
+    components = np.where(targeted, 1 - np.clip(distance, 0, 1), matrix)
+    components = np.where(np.isnan(matrix), NEUTRAL, components)
+    return components @ profile.weights
+
+def top_k(tracks, k=5, profile=None):
+    if not tracks or k <= 0:
+        return []
+    scores = score_matrix(feature_matrix(tracks), profile or default_profile())
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]            # O(n) selection of the k best...
+        best = best[np.argsort(-scores[best], kind='stable')]  # ...then only those k are sorted
+    else:
+        best = np.argsort(-scores, kind='stable')
+    return [tracks[i] for i in best]
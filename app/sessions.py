@@ -0,0 +1,201 @@
+import pickle, threading, time
+from datetime import datetime, timezone
+from flask import current_app
+from flask_session import Session
+from flask_session.sessions import ServerSideSessionInterface, SqlAlchemySession
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from .cache import TTLCache
+from .extensions import db
+from .models import ServerSession
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _naive_utc(value):
+    # The sessions table stores naive UTC, whatever the database's own timezone handling
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+#* Server-side sessions: the cookie only carries a session id. Built on Flask-Session 0.6's interface
+# (sid generation, signing, cookie handling) but, unlike its SQLAlchemy backend, reads go through an
+# in-process cache and an unchanged session is not rewritten and committed on every response
+class CachedSqlAlchemySessionInterface(ServerSideSessionInterface):
+    serializer = pickle
+    session_class = SqlAlchemySession
+
+    def __init__(self):
+        super().__init__(db, key_prefix='session:')
+        self.cache = TTLCache(name='sessions')
+        self.refresh_interval = 300
+        self.cleanup_interval = 600
+        self.writes = 0
+        self.skipped_writes = 0
+        self.conflicts = 0
+        self.cleaned = 0
+        self._last_cleanup = time.monotonic()
+        self._cleanup_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        session_type = config.get('SESSION_TYPE', 'sqlalchemy')
+        if session_type == 'cookie':
+            return  # Flask's signed-cookie sessions
+        if session_type != 'sqlalchemy':
+            Session(app)  # Any other Flask-Session backend (filesystem, redis, ...) as configured
+            return
+        self.key_prefix = config.get('SESSION_KEY_PREFIX', self.key_prefix)
+        self.use_signer = config.get('SESSION_USE_SIGNER', self.use_signer)
+        self.permanent = config.get('SESSION_PERMANENT', self.permanent)
+        self.sid_length = config.get('SESSION_ID_LENGTH', self.sid_length)
+        self.cache.configure(maxsize=config.get('SESSION_CACHE_SIZE'), ttl=config.get('SESSION_CACHE_TTL'))
+        self.refresh_interval = config.get('SESSION_REFRESH_INTERVAL', self.refresh_interval)
+        self.cleanup_interval = config.get('SESSION_CLEANUP_INTERVAL', self.cleanup_interval)
+        app.session_interface = self
+        app.extensions['server_sessions'] = self
+
+    def _fetch_row(self, store_id, connection):
+        return connection.execute(
+            select(ServerSession.data, ServerSession.expiry, ServerSession.version).where(ServerSession.session_id == store_id)
+        ).first()
+
+    def _load(self, store_id):
+        # (data, expiry, version), Nones without a row. Each request checks the row's version, one index lookup
+        # on a short connection; the pickled data comes from the cache while that version is still current, so a
+        # signout or write on another worker is seen at once
+        with db.engine.connect() as connection:  # Returned at once, not held by db.session until teardown
+            version = connection.execute(select(ServerSession.version).where(ServerSession.session_id == store_id)).scalar()
+            entry = self.cache.get(store_id) if version is not None else None
+            if version is not None and (entry is None or entry[2] != version):
+                row = self._fetch_row(store_id, connection)
+                entry = (row.data, row.expiry, row.version) if row else None
+        if entry is None:
+            self.cache.pop(store_id)
+            return None, None, None
+        self.cache.set(store_id, entry)
+        return entry
+
+    def _loads(self, data):
+        try:
+            return self.serializer.loads(data)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+            return None  # Corrupt or written by an older release
+
+    def fetch_session(self, sid):
+        data, expiry, version = self._load(self.key_prefix + sid)
+        values = self._loads(data) if data is not None and expiry is not None and expiry > _utcnow() else None
+        if values is None:
+            # No row, expired (goes in the next cleanup) or unreadable: start afresh, but overwrite the row if there is one
+            session = self.session_class(sid=sid, permanent=self.permanent)
+            session.stored_data = None
+        else:
+            session = self.session_class(values, sid=sid)
+            session.stored_expiry, session.stored_data = expiry, data
+        session.stored_version = version
+        return session
+
+    def _execute(self, statement):
+        # Own short transaction, so saving the session never commits the request's pending ORM work
+        with db.engine.begin() as connection:
+            return connection.execute(statement).rowcount
+
+    @staticmethod
+    def _merge(baseline, ours, theirs):
+        # Replays what this request changed since it read `baseline` onto the row another worker wrote meanwhile
+        merged = dict(theirs)
+        for key in baseline.keys() | ours.keys():
+            if key not in ours:
+                merged.pop(key, None)
+            elif key not in baseline or baseline[key] != ours[key]:
+                merged[key] = ours[key]
+        return merged
+
+    def _store(self, store_id, session, expiry):
+        # Optimistic writes: the UPDATE only applies to the version this request read. On a conflict the request's
+        # own changes are merged onto the newer row; a row deleted meanwhile (signout elsewhere) stays deleted.
+        # Returns False in that case
+        data, version, stored = dict(session), getattr(session, 'stored_version', None), getattr(session, 'stored_data', None)
+        baseline = (self._loads(stored) or {}) if stored is not None else {}
+        for _ in range(3):
+            payload = self.serializer.dumps(data)
+            if version is None:
+                try:
+                    written = self._execute(insert(ServerSession).values(session_id=store_id, data=payload, expiry=expiry, version=1))
+                except IntegrityError:
+                    written = 0  # Another request created it first
+            else:
+                written = self._execute(
+                    update(ServerSession).where(ServerSession.session_id == store_id, ServerSession.version == version)
+                    .values(data=payload, expiry=expiry, version=version + 1)
+                )
+            if written:
+                self.cache.set(store_id, (payload, expiry, (version or 0) + 1))
+                with self._stats_lock:
+                    self.writes += 1
+                return True
+            with db.engine.connect() as connection:
+                row = self._fetch_row(store_id, connection)
+            if row is None:
+                self.cache.pop(store_id)
+                return False
+            theirs = self._loads(row.data) or {}
+            data, baseline, version = self._merge(baseline, data, theirs), theirs, row.version
+            with self._stats_lock:
+                self.conflicts += 1
+        current_app.logger.warning(f"Gave up saving session {store_id} after repeated write conflicts")
+        return True
+
+    def save_session(self, app, session, response):
+        if not self.should_set_cookie(app, session):
+            return
+        self.cleanup_expired()
+        store_id = self.key_prefix + session.sid
+
+        if not session:
+            if session.modified:
+                self._execute(delete(ServerSession).where(ServerSession.session_id == store_id))
+                self.cache.pop(store_id)
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=self.get_cookie_domain(app), path=self.get_cookie_path(app))
+            return
+
+        expires = self.get_expiration_time(app, session)
+        expiry = _naive_utc(expires) if expires else _utcnow() + app.permanent_session_lifetime
+        stored_expiry = getattr(session, 'stored_expiry', None)
+        # A sliding expiry alone only needs a write once it has moved by more than SESSION_REFRESH_INTERVAL
+        if session.modified or stored_expiry is None or (expiry - stored_expiry).total_seconds() > self.refresh_interval:
+            if not self._store(store_id, session, expiry):
+                response.delete_cookie(app.config['SESSION_COOKIE_NAME'], domain=self.get_cookie_domain(app), path=self.get_cookie_path(app))
+                return  # Signed out on another worker meanwhile
+        else:
+            with self._stats_lock:
+                self.skipped_writes += 1
+        self.set_cookie_to_response(app, session, response, expires)
+
+    def cleanup_expired(self, force=False):
+        # Piggybacks on requests: at most one DELETE of expired rows per SESSION_CLEANUP_INTERVAL per worker
+        now = time.monotonic()
+        if not force and now - self._last_cleanup < self.cleanup_interval:
+            return 0
+        if not self._cleanup_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._last_cleanup = now
+            removed = self._execute(delete(ServerSession).where(ServerSession.expiry <= _utcnow()))
+            self.cleaned += removed  # Only ever updated under _cleanup_lock
+            return removed
+        finally:
+            self._cleanup_lock.release()
+
+    def stats(self):
+        return {
+            'cache': self.cache.stats(),
+            'writes': self.writes,
+            'skipped_writes': self.skipped_writes,
+            'write_conflicts': self.conflicts,
+            'expired_cleaned': self.cleaned
+        }
+
+
+server_sessions = CachedSqlAlchemySessionInterface()
@@ -0,0 +1,130 @@
+import threading, time
+from collections import OrderedDict
+import requests, spotipy, urllib3
+from requests.adapters import HTTPAdapter
+
+
+class PooledSpotify(spotipy.Spotify):
+    # spotipy closes its session on garbage collection; the session here is shared by every client
+    def __del__(self):
+        pass
+
+
+#* Per-worker registry of Spotify clients keyed by access token, all sharing one keep-alive HTTP pool
+class SpotifyClientRegistry:
+    def __init__(self, pool_size=10, retries=3, backoff_factor=0.3, requests_timeout=5, idle_timeout=900, max_clients=1024):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.requests_timeout = requests_timeout
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clients = OrderedDict()  # access token -> (client, last used), least recently used first
+        self._session = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.pool_size = app.config.get('SPOTIFY_POOL_SIZE', self.pool_size)
+        self.retries = app.config.get('SPOTIFY_RETRIES', self.retries)
+        self.backoff_factor = app.config.get('SPOTIFY_BACKOFF_FACTOR', self.backoff_factor)
+        self.requests_timeout = app.config.get('SPOTIFY_REQUESTS_TIMEOUT', self.requests_timeout)
+        self.idle_timeout = app.config.get('SPOTIFY_CLIENT_IDLE_TIMEOUT', self.idle_timeout)
+        self.max_clients = app.config.get('SPOTIFY_MAX_CLIENTS', self.max_clients)
+        self.reset()
+        app.extensions['spotify_clients'] = self
+
+    def _build_session(self):
+        # Same retry policy spotipy builds for itself, but on one adapter shared by all clients
+        retry = urllib3.Retry(
+            total=self.retries,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=spotipy.Spotify.default_retry_codes
+        )
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def get(self, access_token):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(access_token)
+            if entry:
+                self.hits += 1
+                self._clients[access_token] = (entry[0], now)
+                self._clients.move_to_end(access_token)
+                return entry[0]
+            self.misses += 1
+            self._evict(now)
+
+        client = PooledSpotify(auth=access_token, requests_session=self.session, requests_timeout=self.requests_timeout)
+        with self._lock:
+            self._clients[access_token] = (client, now)
+        return client
+
+    def _evict(self, now):
+        # Caller holds the lock. Idle clients sit at the front of the ordered dict
+        while self._clients:
+            token, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout and len(self._clients) < self.max_clients:
+                break
+            del self._clients[token]
+            self.evictions += 1
+
+    def discard(self, access_token):
+        with self._lock:
+            self._clients.pop(access_token, None)
+
+    def reset(self):
+        # Drops every client and the connection pool, e.g. in a freshly forked worker
+        with self._lock:
+            session, self._session = self._session, None
+            self._clients.clear()
+        if session is not None:
+            session.close()
+
+    def connection_stats(self):
+        requests_sent = connections_opened = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests_sent += pool.num_requests
+                        connections_opened += pool.num_connections
+        return requests_sent, connections_opened
+
+    def stats(self):
+        requests_sent, connections_opened = self.connection_stats()
+        lookups = self.hits + self.misses
+        return {
+            'clients': len(self._clients),
+            'client_hits': self.hits,
+            'client_misses': self.misses,
+            'client_evictions': self.evictions,
+            'client_hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'pool_size': self.pool_size,
+            'requests': requests_sent,
+            'connections_opened': connections_opened,
+            'connection_reuse_rate': round(1 - connections_opened / requests_sent, 4) if requests_sent else None
+        }
+
+
+spotify_clients = SpotifyClientRegistry()
@@ -0,0 +1,137 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.oauth2 import SpotifyOAuth
+from .extensions import db
+from .models import User
+
+
+#* Spotify OAuth tokens persisted on the users table, refreshed ahead of expiry
+class TokenManager:
+    def __init__(self, refresh_margin=60, refresh_ahead=1440, max_workers=2, lock_stripes=64):
+        self.refresh_margin = refresh_margin  # Seconds left at which a request has to wait for the refresh
+        self.refresh_ahead = refresh_ahead    # Seconds left at which a background refresh is scheduled
+        self.max_workers = max_workers
+        self.refreshes = 0
+        self.background_refreshes = 0
+        self.failures = 0
+        # Striped per-user locks, so concurrent refreshes of one user collapse into one; a fixed set instead of a
+        # lock per user ever seen, at the cost of unrelated users occasionally sharing a stripe
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._scheduled = set()   # user_ids with a background refresh queued or running
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        self.refresh_margin = app.config.get('TOKEN_REFRESH_MARGIN', self.refresh_margin)
+        self.refresh_ahead = app.config.get('TOKEN_REFRESH_AHEAD', self.refresh_ahead)
+        self.max_workers = app.config.get('TOKEN_REFRESH_WORKERS', self.max_workers)
+        app.extensions['token_manager'] = self
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='token-refresh')
+        return self._executor
+
+    @staticmethod
+    def _oauth():
+        return SpotifyOAuth(
+            client_id=current_app.config['SPOTIFY_CLIENT_ID'],
+            client_secret=current_app.config['SPOTIFY_CLIENT_SECRET'],
+            redirect_uri=current_app.config['SPOTIFY_REDIRECT_URI'],
+            scope=current_app.config['SPOTIFY_SCOPES'],
+            cache_handler=MemoryCacheHandler()  # Tokens live in the database, never in a .cache file
+        )
+
+    @staticmethod
+    def token_info(user):
+        return {
+            'access_token': user.access_token,
+            'refresh_token': user.refresh_token,
+            'expires_at': user.expires_at
+        }
+
+    @staticmethod
+    def store(user, token_info):
+        user.access_token = token_info['access_token']
+        user.refresh_token = token_info.get('refresh_token') or user.refresh_token
+        user.expires_at = token_info['expires_at']
+        db.session.commit()
+
+    def refresh(self, user_id, min_remaining=None, background=False):
+        # Single flight per user: whoever waited on the lock finds the refreshed row and returns it
+        min_remaining = self.refresh_margin if min_remaining is None else min_remaining
+        with self._lock_for(user_id):
+            user = User.query.filter_by(user_id=user_id).populate_existing().first()
+            if not user or not user.refresh_token:
+                return None
+            if user.expires_at and user.expires_at - int(time.time()) > min_remaining:
+                return self.token_info(user)
+            try:
+                token_info = self._oauth().refresh_access_token(user.refresh_token)
+            except Exception:
+                self.failures += 1
+                db.session.rollback()
+                raise
+            self.store(user, token_info)
+            self.refreshes += 1
+            if background:
+                self.background_refreshes += 1  # Only refreshes that reached Spotify, not rows already fresh
+            return self.token_info(user)
+
+    def schedule_refresh(self, user_id):
+        with self._lock:
+            if user_id in self._scheduled:
+                return False
+            self._scheduled.add(user_id)
+        app = current_app._get_current_object()
+        self._get_executor().submit(self._refresh_in_background, app, user_id)
+        return True
+
+    def _refresh_in_background(self, app, user_id):
+        try:
+            with app.app_context():
+                self.refresh(user_id, min_remaining=self.refresh_ahead, background=True)
+        except Exception as e:
+            app.logger.error(f"Background token refresh failed for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._scheduled.discard(user_id)
+
+    def get_token_info(self, user_id, session_token_info=None):
+        user = User.query.filter_by(user_id=user_id).first() if user_id else None
+        if user is None:
+            return session_token_info
+        if not user.access_token and session_token_info:
+            self.store(user, session_token_info)  # Users who logged in before tokens were persisted
+
+        remaining = (user.expires_at or 0) - int(time.time())
+        if remaining <= self.refresh_margin:
+            return self.refresh(user_id) or session_token_info
+        if remaining <= self.refresh_ahead:
+            self.schedule_refresh(user_id)  # The current token is still valid for this request
+        return self.token_info(user)
+
+    def reset(self):
+        # Executor threads do not survive a fork
+        with self._lock:
+            self._executor = None
+            self._scheduled.clear()
+            self._locks = [threading.Lock() for _ in self._locks]  # One may have been held by a thread the fork dropped
+
+    def stats(self):
+        return {
+            'refreshes': self.refreshes,
+            'background_refreshes': self.background_refreshes,
+            'failures': self.failures,
+            'scheduled': len(self._scheduled)
+        }
+
+
+token_manager = TokenManager()
@@ -1,11 +1,26 @@
 from flask import current_app, session
 from .models import Song, Emotion
-import spotipy, random, os
+from .genres import genre_catalog
+from .cache import TTLCache, SingleFlight
+from .spotify import spotify_clients
+from .catalog import local_tracks, schedule_ingest
+from .warmer import warm_pools
+from . import scoring
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import namedtuple
+import random, os, re, threading, time
 
 random.seed(42)
-ALL_GENRES = []
+
+# Spotify responses shared across users: playlist search results and playlist track listings
+search_cache = TTLCache(name='spotify_search')
+playlist_tracks_cache = TTLCache(name='spotify_playlist_tracks')
+spotify_flight = SingleFlight(name='spotify')  # Identical concurrent cache misses make one upstream call
 
 def init_app(app):
+    search_cache.configure(maxsize=app.config.get('SPOTIFY_CACHE_SIZE'), ttl=app.config.get('SPOTIFY_SEARCH_CACHE_TTL'))
+    playlist_tracks_cache.configure(maxsize=app.config.get('SPOTIFY_CACHE_SIZE'), ttl=app.config.get('SPOTIFY_TRACKS_CACHE_TTL'))
+    spotify_flight.configure(timeout=app.config.get('SINGLE_FLIGHT_TIMEOUT'))
     return os.path.join(app.static_folder, 'genres.md')
 
 #* Defining the attributes for each emotion
@@ -68,53 +83,172 @@ def get_spotify_client(access_token=None):
             current_app.logger.error("No token info in session")
             return None
         access_token = session['token_info']['access_token']
-    return spotipy.Spotify(auth=access_token)
+    return spotify_clients.get(access_token)  # Reuses the client and its keep-alive connections
+
+def search_playlists(sp, query, limit=5):
+    key = ('search', query, limit)
+    return search_cache.get_or_set(key, lambda: spotify_flight.do(key, lambda: sp.search(q=query, type='playlist', limit=limit)))
+
+def fetch_playlist_tracks(sp, playlist_id):
+    key = ('playlist_tracks', playlist_id)
+    return playlist_tracks_cache.get_or_set(playlist_id, lambda: spotify_flight.do(key, lambda: sp.playlist_tracks(playlist_id)))
 
 
 #* 2. Get tracks from Spotify based on the user's selected genres and the emotion
-def get_random_tracks(emotion, min_count=10, max_count=20):
-    sp = get_spotify_client()
+# Map emotion to search keyword
+EMOTION_KEYWORDS = {
+    Emotion.JOY: "happy",
+    Emotion.TENDER: "chill",
+    Emotion.ANGER: "intense",
+    Emotion.SADNESS: "sad"
+}
+
+# Bounded pool shared by all requests of a worker for concurrent search/playlist_tracks calls
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+def get_fanout_executor():
+    global _fanout_executor
+    if _fanout_executor is None:
+        with _fanout_lock:
+            if _fanout_executor is None:
+                _fanout_executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('PLAYLIST_FANOUT_WORKERS', 8),
+                    thread_name_prefix='spotify-fanout'
+                )
+    return _fanout_executor
+
+def reset_fanout_executor():
+    global _fanout_executor
+    _fanout_executor = None
+
+def _playlist_items(results):
+    if not results or not results.get('playlists'):
+        return []
+    return [playlist for playlist in results['playlists']['items'] if playlist]
+
+def song_from_item(item, emotion=None):
+    track = item['track']
+    return Song(
+        spotify_id=track['id'],
+        title=track['name'],
+        artist=track['artists'][0]['name'],
+        album=track['album']['name'],
+        popularity=track['popularity'],
+        emotion=emotion
+    )
+
+def _merge_track_items(candidates, playlist_results, origins=None, origin=None):
+    for item in (playlist_results or {}).get('items') or []:
+        if item and item.get('track') and item['track'].get('id'):
+            track_id = item['track']['id']
+            if track_id not in candidates:  # Same track from two playlists counts once
+                candidates[track_id] = item
+                if origins is not None:
+                    origins[track_id] = origin
+
+# Runs the searches and the playlist_tracks calls they lead to concurrently, merging track items
+# from whichever calls return first until there are `enough` distinct tracks or the deadline passes.
+# `origins`, when given, is filled with track id -> the query the track was found under
+def fan_out_candidates(sp, queries, playlists_per_query=2, timeout=4.0, enough=20, origins=None):
+    executor = get_fanout_executor()
+    deadline = time.monotonic() + timeout
+    pending = {executor.submit(search_playlists, sp, query, 5): ('search', query) for query in queries}
+    candidates = {}
+
+    while pending and len(candidates) < enough:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            current_app.logger.warning(f"Candidate fan-out hit its {timeout}s deadline with {len(pending)} calls pending")
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind, key = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                current_app.logger.warning(f"Fan-out {kind} call failed for {key}: {e}")
+                continue
+            if kind == 'search':
+                for playlist in _playlist_items(result)[:playlists_per_query]:
+                    pending[executor.submit(fetch_playlist_tracks, sp, playlist['id'])] = ('playlist_tracks', (playlist['id'], key))
+            else:
+                _merge_track_items(candidates, result, origins, origin=key[1])
+
+    for future in pending:
+        future.cancel()  # Not started yet; running calls still finish and warm the caches
+    return list(candidates.values())
+
+def _pick_genres(user_genres, random_genres, count):
+    # User genres first (shuffled), topped up with the random catalog genres
+    ordered = random.sample(user_genres, k=len(user_genres)) + list(random_genres)
+    return list(dict.fromkeys(ordered))[:max(count, 1)]
+
+def get_random_tracks(emotion, min_count=10, max_count=20, fanout=None, user_genres=None, sp=None):
+    # Combine user and random genres (catalog is loaded once per worker); outside a request (playlist jobs)
+    # the caller passes the user's genres and Spotify client instead of the session
+    if user_genres is None:
+        user_genres = session.get('selectedGenres', [])
+    config = current_app.config
+
+    # Local-first: warm emotion/genre combinations are served from the track catalog
+    if config.get('LOCAL_FIRST_PLAYLISTS', True):
+        try:
+            local = local_tracks(emotion, user_genres, min_pool=max(min_count, config.get('LOCAL_CATALOG_MIN_POOL', 40)),
+                                 max_count=max_count, target=EMOTION_PROFILES.get(emotion))
+        except Exception as e:
+            current_app.logger.warning(f"Local catalog lookup failed, falling back to Spotify: {e}")
+            local = None
+        if local:
+            return local
+
+    random_genres = genre_catalog.sample(3)
+    genres = _pick_genres(user_genres, random_genres, config.get('PLAYLIST_FANOUT_GENRES', 3))
+
+    # Warm pools: candidate sets for hot emotion/genre pairs, kept fresh in the background (warmer.py)
+    warm_pools.record(emotion, genres)
+    pooled = warm_pools.sample(emotion, genres, min_count, max_count) if warm_pools.enabled else None
+    if pooled:
+        return [song_from_item(item, emotion) for item in pooled]
+
+    sp = sp or get_spotify_client()
     if not sp:
         raise Exception("Spotify client not authenticated")
 
-    # Load genres (unchanged)
-    GENRES_PATH = current_app.config['GENRES_PATH']
-    ALL_GENRES = []
-    with open(GENRES_PATH, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-        for line in lines:
-            if line.strip() and line.strip()[0].isdigit():
-                genre = line.strip().split('. ', 1)[1]
-                ALL_GENRES.append(genre)
-
-    # Combine user and random genres
-    user_genres = session.get('selectedGenres', [])
-    random_genres = random.sample(ALL_GENRES, k=3)
     combined_genres = list(set(user_genres + random_genres))
-
-    # Map emotion to keyword
-    emotion_map = {
-        Emotion.JOY: "happy",
-        Emotion.TENDER: "chill",
-        Emotion.ANGER: "intense",
-        Emotion.SADNESS: "sad"
-    }
-    emotion_keyword = emotion_map.get(emotion, "happy")  # Default to "happy"
-    selected_genre = random.choice(user_genres if user_genres else combined_genres)
+    emotion_keyword = EMOTION_KEYWORDS.get(emotion, "happy")  # Default to "happy"
+    if fanout is None:
+        fanout = config.get('PLAYLIST_FANOUT_ENABLED', True)
 
     try:
-        # Search for playlists
-        query = f"{emotion_keyword} {selected_genre}"
-        results = sp.search(q=query, type='playlist', limit=5)
-        if not results or not results['playlists']['items']: #check if results or items exist.
-            return []
+        origins = {}
+        if fanout:
+            # Query several genres and several playlists per genre at once
+            queries = {f"{emotion_keyword} {genre}": genre for genre in genres}
+            all_tracks = fan_out_candidates(
+                sp, list(queries),
+                playlists_per_query=config.get('PLAYLIST_FANOUT_PLAYLISTS', 2),
+                timeout=config.get('PLAYLIST_FANOUT_TIMEOUT', 4.0),
+                enough=max_count,
+                origins=origins
+            )
+        else:
+            # Search for playlists
+            selected_genre = random.choice(user_genres if user_genres else combined_genres)
+            query = f"{emotion_keyword} {selected_genre}"
+            queries = {query: selected_genre}
+            playlists = _playlist_items(search_playlists(sp, query, limit=5))
+            if not playlists:
+                return []
 
-        # Fetch tracks from the first playlist
-        playlist_id = results['playlists']['items'][0]['id']
-        playlist_results = sp.playlist_tracks(playlist_id)
-        if not playlist_results or not playlist_results['items']: #check if playlist_results or items exist.
-            return []
-        all_tracks = playlist_results['items']
+            # Fetch tracks from the first playlist
+            candidates = {}
+            _merge_track_items(candidates, fetch_playlist_tracks(sp, playlists[0]['id']), origins, origin=query)
+            all_tracks = list(candidates.values())
+
+        # Feed the local catalog in the background so the next request can skip Spotify
+        if all_tracks:
+            schedule_ingest(sp, all_tracks, emotion, {track_id: queries.get(query) for track_id, query in origins.items()})
 
         # Select tracks
         if len(all_tracks) < min_count:
@@ -122,18 +256,7 @@ def get_random_tracks(emotion, min_count=10, max_count=20):
         selected_tracks = random.sample(all_tracks, k=min(max_count, len(all_tracks)))
 
         # Parse into Song objects
-        song_objects = []
-        for item in selected_tracks:
-            if item and item['track'] and item['track']['id']: # Check that item, track, and track id exist.
-                song_objects.append(Song(
-                    spotify_id=item['track']['id'],
-                    title=item['track']['name'],
-                    artist=item['track']['artists'][0]['name'],
-                    album=item['track']['album']['name'],
-                    popularity=item['track']['popularity'],
-                    emotion=emotion
-                ))
-        return song_objects
+        return [song_from_item(item, emotion) for item in selected_tracks]
 
     except Exception as e:
         print(f"Error fetching tracks: {str(e)}")
@@ -141,8 +264,8 @@ def get_random_tracks(emotion, min_count=10, max_count=20):
 
 
 #* 3. Function for creating a Spotify playlist
-def create_spotify_playlist(tracks):
-    sp = get_spotify_client()
+def create_spotify_playlist(tracks, sp=None, user_id=None):
+    sp = sp or get_spotify_client()
     if not sp:
         raise Exception("Spotify client not authenticated")
     if not tracks:  # Ensure there are tracks to add
@@ -150,7 +273,7 @@ def create_spotify_playlist(tracks):
         return None
 
     try:
-        user_id = sp.me()['id']
+        user_id = user_id or session.get('user_id') or sp.me()['id']  # Stored at login, saves a /me round trip
         playlist = sp.user_playlist_create(user_id, "Emotion-based Playlist", public=False)
         track_uris = [f"spotify:track:{track.spotify_id}" for track in tracks]
         sp.playlist_add_items(playlist['id'], track_uris)
@@ -166,24 +289,26 @@ def get_embedded_playlist_code(playlist_id):
 def get_embedded_track_code(track_id):
     return f'<iframe src="https://open.spotify.com/embed/track/{track_id}" width="300" height="380" frameborder="0" allowfullscreen="" allowtransparency="true" allow="encrypted-media"></iframe>'
 
+# The 22-character base62 track id inside an embed iframe, an open.spotify.com link, a spotify:track: URI, or on its own
+TRACK_REFERENCE = re.compile(r'(?:^|/track/|spotify:track:)([A-Za-z0-9]{22})(?![A-Za-z0-9])')
 
-#* 5. Defining each metric's weight in the overall recommendation of the song
-def calculate_composite_score(track):
-    return (
-        track.danceability * 0.1 +
-        track.energy * 0.1 +
-        track.loudness * 0.05 +
-        track.speechiness * 0.05 +
-        track.acousticness * 0.1 +
-        track.instrumentalness * 0.1 +
-        track.liveness * 0.05 +
-        track.valence * 0.1 +
-        track.tempo * 0.05 +
-        track.popularity * 0.3  # Give more weight to popularity
-    )
+def parse_track_id(reference):
+    if not isinstance(reference, str):
+        return None
+    match = TRACK_REFERENCE.search(reference.strip())
+    return match.group(1) if match else None
+
+
+#* 5. Defining each metric's weight in the overall recommendation of the song (see scoring.py)
+EMOTION_PROFILES = {emotion: scoring.emotion_profile(attributes) for emotion, attributes in emotion_to_attributes.items()}
 
 
 #* 6. Recommend top 5 tracks
+def rank_tracks(tracks, limit=5, emotion=None):
+    # Batch-scored; tracks without audio features are effectively ranked by popularity
+    profile = EMOTION_PROFILES.get(emotion) or scoring.default_profile()
+    return scoring.top_k(tracks, k=limit, profile=profile)
+
 def get_top_recommended_tracks(playlist_id, limit=5):
     sp = get_spotify_client()
     if not sp:
@@ -191,17 +316,30 @@ def get_top_recommended_tracks(playlist_id, limit=5):
 
     try:
         playlist_tracks = sp.playlist_tracks(playlist_id)
-        tracks = [Song(
-            spotify_id=item['track']['id'],
-            title=item['track']['name'],
-            artist=item['track']['artists'][0]['name'],
-            album=item['track']['album']['name'],
-            popularity=item['track']['popularity']
-        ) for item in playlist_tracks['items']]
-
-        # Sort by popularity
-        sorted_tracks = sorted(tracks, key=lambda track: track.popularity, reverse=True)
-        return sorted_tracks[:limit]
+        tracks = [song_from_item(item) for item in playlist_tracks['items'] if item and item.get('track')]
+        return rank_tracks(tracks, limit)
     except Exception as e:
         print(f"Error fetching playlist tracks: {str(e)}")
-        return []
\ No newline at end of file
+        return []
+
+
+#* 7. Playlist pipeline: the selected tracks are carried through creation and ranking in process
+PlaylistBuild = namedtuple('PlaylistBuild', ['playlist_id', 'tracks', 'top_tracks'])
+
+def playlist_stages(emotion, top_limit=5, user_genres=None, sp=None, user_id=None):
+    # Yields ('candidates', tracks), ('playlist', playlist_id), ('top_tracks', ranked) as each step finishes,
+    # and stops early when there are no tracks or the playlist could not be created
+    tracks = get_random_tracks(emotion, user_genres=user_genres, sp=sp)
+    if not tracks:
+        return
+    yield 'candidates', tracks
+    playlist_id = create_spotify_playlist(tracks, sp=sp, user_id=user_id)
+    if not playlist_id:
+        return
+    yield 'playlist', playlist_id
+    # Rank the tracks already in hand instead of fetching the new playlist back from Spotify
+    yield 'top_tracks', rank_tracks(tracks, top_limit, emotion)
+
+def build_playlist(emotion, top_limit=5, **context):
+    stages = dict(playlist_stages(emotion, top_limit, **context))
+    return PlaylistBuild(stages.get('playlist'), stages.get('candidates', []), stages.get('top_tracks', []))
@@ -0,0 +1,194 @@
+import random, threading, time
+from collections import Counter, OrderedDict
+from flask import current_app
+from sqlalchemy import func, select
+from .extensions import db
+from .models import Emotion, UserGenre
+
+
+#* Bounded store of candidate track items per (emotion, genre), each stamped with when it was fetched
+class PoolStore:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._pools = OrderedDict()  # (emotion, genre) -> (items, refreshed_at), least recently used first
+        self._lock = threading.Lock()
+
+    def put(self, key, items):
+        with self._lock:
+            self._pools[key] = (tuple(items), time.monotonic())
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.maxsize:
+                self._pools.popitem(last=False)
+
+    def get(self, key, max_age):
+        with self._lock:
+            entry = self._pools.get(key)
+            if entry is None or time.monotonic() - entry[1] > max_age:
+                return None
+            self._pools.move_to_end(key)
+            return entry[0]
+
+    def age(self, key):
+        entry = self._pools.get(key)
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+    def __len__(self):
+        return len(self._pools)
+
+
+#* Warm pools: a background thread keeps candidate sets for the hottest (emotion, genre) pairs fresh, so
+# get_random_tracks mostly samples instead of searching. Hotness is the genre's popularity in user_genres
+# plus recent demand seen by this worker; fetches use an app (client-credentials) Spotify client
+class PoolWarmer:
+    def __init__(self):
+        self.enabled = False
+        self.interval = 300
+        self.max_age = 1800
+        self.hot_pairs = 24
+        self.fetches_per_cycle = 8
+        self.tracks_per_pool = 100
+        self.demand_weight = 5
+        self.store = PoolStore()
+        self.demand = Counter()      # (emotion, genre) -> recent requests, halved every cycle
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+        self.failures = 0
+        self.cycles = 0
+        self._client = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = bool(config.get('WARM_POOL_ENABLED') and config.get('SPOTIFY_CLIENT_ID') and config.get('SPOTIFY_CLIENT_SECRET'))
+        self.interval = config.get('WARM_POOL_INTERVAL', self.interval)
+        self.max_age = config.get('WARM_POOL_MAX_AGE', self.max_age)
+        self.hot_pairs = config.get('WARM_POOL_HOT_PAIRS', self.hot_pairs)
+        self.fetches_per_cycle = config.get('WARM_POOL_FETCHES_PER_CYCLE', self.fetches_per_cycle)
+        self.tracks_per_pool = config.get('WARM_POOL_TRACKS', self.tracks_per_pool)
+        self.store.maxsize = config.get('WARM_POOL_MAX_POOLS', self.store.maxsize)
+        app.extensions['warm_pools'] = self
+
+    def record(self, emotion, genres):
+        # Demand from live requests; also starts this worker's warmer on first use (after any fork)
+        if not self.enabled:
+            return
+        with self._lock:
+            for genre in genres:
+                self.demand[(emotion, genre)] += 1
+        self.ensure_started(current_app._get_current_object())
+
+    def sample(self, emotion, genres, min_count, max_count):
+        # Track items drawn from the fresh pools of these genres, or None when they hold too few
+        candidates = {}
+        for genre in genres:
+            for item in self.store.get((emotion, genre), self.max_age) or ():
+                candidates.setdefault(item['track']['id'], item)
+        with self._lock:
+            if len(candidates) < min_count:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return random.sample(list(candidates.values()), k=min(max_count, len(candidates)))
+
+    def ensure_started(self, app):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._wake.clear()
+                self._thread = threading.Thread(target=self._run, args=(app,), name='warm-pools', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        thread = threading.current_thread()
+        while self._thread is thread:
+            with app.app_context():
+                try:
+                    self.warm()
+                except Exception as e:
+                    self.failures += 1
+                    app.logger.warning(f"Warm pool cycle failed: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def hottest(self):
+        # Top (emotion, genre) pairs by user_genres popularity plus weighted recent demand
+        rows = db.session.execute(
+            select(UserGenre.genre, func.count()).group_by(UserGenre.genre).order_by(func.count().desc()).limit(self.hot_pairs)
+        ).all()
+        scores = Counter({(emotion, genre): count for genre, count in rows for emotion in Emotion})
+        with self._lock:
+            for key, requests in self.demand.items():
+                scores[key] += requests * self.demand_weight
+        return [key for key, _ in scores.most_common(self.hot_pairs)]
+
+    def warm(self):
+        from .utils import EMOTION_KEYWORDS, fan_out_candidates
+        config = current_app.config
+        refreshed = 0
+        for emotion, genre in self.hottest():
+            if refreshed >= self.fetches_per_cycle:
+                break  # Bounded Spotify traffic per cycle; the rest waits for the next one
+            age = self.store.age((emotion, genre))
+            if age is not None and age < self.max_age / 2:
+                continue  # Still fresh for at least half its lifetime
+            items = fan_out_candidates(
+                self.client(), [f"{EMOTION_KEYWORDS[emotion]} {genre}"],
+                playlists_per_query=config.get('PLAYLIST_FANOUT_PLAYLISTS', 2),
+                timeout=config.get('PLAYLIST_FANOUT_TIMEOUT', 4.0),
+                enough=self.tracks_per_pool
+            )
+            if items:
+                self.store.put((emotion, genre), items[:self.tracks_per_pool])
+                refreshed += 1
+        with self._lock:
+            self.demand = Counter({key: count // 2 for key, count in self.demand.items() if count > 1})
+        self.refreshed += refreshed
+        self.cycles += 1
+        return refreshed
+
+    def client(self):
+        # Search and public playlist tracks need no user: one app-token client per worker
+        if self._client is None:
+            from spotipy.cache_handler import MemoryCacheHandler
+            from spotipy.oauth2 import SpotifyClientCredentials
+            from .spotify import PooledSpotify, spotify_clients
+            config = current_app.config
+            self._client = PooledSpotify(
+                auth_manager=SpotifyClientCredentials(config['SPOTIFY_CLIENT_ID'], config['SPOTIFY_CLIENT_SECRET'],
+                                                      cache_handler=MemoryCacheHandler()),  # No .cache file per worker
+                requests_session=spotify_clients.session,
+                requests_timeout=spotify_clients.requests_timeout
+            )
+        return self._client
+
+    def reset(self):
+        # The warmer thread does not survive a fork; the child starts its own on its first request
+        with self._lock:
+            self._thread = self._client = None
+            self.demand.clear()
+        self.store.clear()
+        self._wake.set()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'pools': len(self.store),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'refreshed': self.refreshed,
+            'cycles': self.cycles,
+            'failures': self.failures
+        }
+
+
+warm_pools = PoolWarmer()
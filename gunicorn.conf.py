@@ -0,0 +1,46 @@
+import multiprocessing, os
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('true', '1', 't')
+
+
+#* Worker model: almost every request waits on Spotify or Moonshot, so each process serves many requests
+# at once on threads (gthread, the default) or greenlets (gevent, when it is installed)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+        monkey.patch_all()  # Before the preloaded app imports sockets, locks and threads
+    except ImportError:
+        worker_class = 'gthread'
+
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 4)))  # Set by Heroku per dyno size
+threads = int(os.environ.get('GUNICORN_THREADS', 8))                          # gthread: requests in flight per worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))  # gevent: requests in flight per worker
+concurrency = threads if worker_class == 'gthread' else worker_connections
+
+os.environ.setdefault('FLASK_CONFIG', 'production')  # run.py picks the config class from it
+
+# Per-worker pools follow the in-flight request count unless set explicitly
+os.environ.setdefault('SPOTIFY_POOL_SIZE', str(min(concurrency, 50)))
+os.environ.setdefault('PLAYLIST_FANOUT_WORKERS', str(min(concurrency, 16)))
+os.environ.setdefault('LLM_CALL_WORKERS', str(min(concurrency * 2, 64)))  # A sync refinement plus its hedge
+# Database connections come from one budget for the whole dyno (DB_MAX_CONNECTIONS, kept below the Postgres
+# plan's limit to leave room for one-off dynos and migrations), split evenly across workers. Half of each
+# worker's share stays open, the other half is overflow for peaks such as a request holding its db.session
+# while the session store writes, or the job, ingest, token-refresh and warmer threads
+db_connections = max(int(os.environ.get('DB_MAX_CONNECTIONS', 16)) // workers, 2)
+os.environ.setdefault('DB_POOL_SIZE', str(min(concurrency, db_connections - db_connections // 2)))
+os.environ.setdefault('DB_MAX_OVERFLOW', str(db_connections // 2))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+preload_app = _env_bool('GUNICORN_PRELOAD', True)  # app.boot rebuilds pools and threads in each forked worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))  # Heroku's router gives up after 30s anyway
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 20))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} booted: {worker_class}, {concurrency} concurrent requests")
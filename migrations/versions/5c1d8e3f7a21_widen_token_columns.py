@@ -0,0 +1,29 @@
+"""widen token columns
+
+Revision ID: 5c1d8e3f7a21
+Revises: 2092bd632020
+Create Date: 2026-10-18 10:12:04.311872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e3f7a21'
+down_revision = '2092bd632020'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Spotify access tokens can exceed 255 characters now that they are persisted
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('access_token', existing_type=sa.String(length=255), type_=sa.Text(), existing_nullable=True)
+        batch_op.alter_column('refresh_token', existing_type=sa.String(length=255), type_=sa.Text(), existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.alter_column('refresh_token', existing_type=sa.Text(), type_=sa.String(length=255), existing_nullable=True)
+        batch_op.alter_column('access_token', existing_type=sa.Text(), type_=sa.String(length=255), existing_nullable=True)
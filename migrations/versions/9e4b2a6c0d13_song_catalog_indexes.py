@@ -0,0 +1,32 @@
+"""song catalog genre column and indexes
+
+Revision ID: 9e4b2a6c0d13
+Revises: 5c1d8e3f7a21
+Create Date: 2026-10-18 11:02:47.590214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b2a6c0d13'
+down_revision = '5c1d8e3f7a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('song', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('genre', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_song_emotion_genre', ['emotion', 'genre'], unique=False)
+        batch_op.create_index('ix_song_emotion_valence_energy', ['emotion', 'valence', 'energy'], unique=False)
+        batch_op.create_index('ix_song_emotion_danceability_tempo', ['emotion', 'danceability', 'tempo'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('song', schema=None) as batch_op:
+        batch_op.drop_index('ix_song_emotion_danceability_tempo')
+        batch_op.drop_index('ix_song_emotion_valence_energy')
+        batch_op.drop_index('ix_song_emotion_genre')
+        batch_op.drop_column('genre')
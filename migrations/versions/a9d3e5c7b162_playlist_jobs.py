@@ -0,0 +1,41 @@
+"""playlist_jobs table for background playlist generation
+
+Revision ID: a9d3e5c7b162
+Revises: e2c7a9b4f816
+Create Date: 2026-10-18 16:40:27.118092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5c7b162'
+down_revision = 'e2c7a9b4f816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('playlist_jobs',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.String(length=100), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('events', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('error_status', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('playlist_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_playlist_jobs_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_playlist_jobs_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playlist_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_playlist_jobs_updated_at'))
+        batch_op.drop_index(batch_op.f('ix_playlist_jobs_user_id'))
+
+    op.drop_table('playlist_jobs')
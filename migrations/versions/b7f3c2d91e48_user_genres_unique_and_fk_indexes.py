@@ -0,0 +1,36 @@
+"""user_genres unique (user_id, genre), saved_top_songs_links user_id index
+
+Revision ID: b7f3c2d91e48
+Revises: 9e4b2a6c0d13
+Create Date: 2026-10-18 14:26:09.118305
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3c2d91e48'
+down_revision = '9e4b2a6c0d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The old delete-then-insert update could leave duplicates behind; keep the first row of each pair
+    op.execute(
+        "DELETE FROM user_genres WHERE id NOT IN "
+        "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM user_genres GROUP BY user_id, genre) AS keep)"
+    )
+    with op.batch_alter_table('user_genres', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_genres_user_id_genre', ['user_id', 'genre'])
+
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_saved_top_songs_links_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_saved_top_songs_links_user_id'))
+
+    with op.batch_alter_table('user_genres', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_genres_user_id_genre', type_='unique')
@@ -0,0 +1,26 @@
+"""version column on sessions for conditional writes
+
+Revision ID: c5e1f8a3b6d0
+Revises: a9d3e5c7b162
+Create Date: 2026-10-18 19:12:44.305817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1f8a3b6d0'
+down_revision = 'a9d3e5c7b162'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,67 @@
+"""saved_top_songs_links stores bare track ids, unique per user
+
+Revision ID: d4a8e6f1b259
+Revises: b7f3c2d91e48
+Create Date: 2026-10-18 15:03:41.772086
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a8e6f1b259'
+down_revision = 'b7f3c2d91e48'
+branch_labels = None
+depends_on = None
+
+TRACK_ID = re.compile(r"/track/([A-Za-z0-9]+)")
+EMBED_URL = "https://open.spotify.com/embed/track/{}?utm_source=generator"
+
+
+def upgrade():
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('track_id', sa.String(length=64), nullable=True))
+
+    # Backfill from the stored embed URLs; keep the first save of each (user, track) and drop unparseable rows
+    connection = op.get_bind()
+    links = sa.table('saved_top_songs_links', sa.column('id', sa.Integer), sa.column('user_id', sa.String),
+                     sa.column('top_songs_links', sa.Text), sa.column('track_id', sa.String))
+    seen, updates, duplicates = set(), [], []
+    for row in connection.execute(sa.select(links.c.id, links.c.user_id, links.c.top_songs_links).order_by(links.c.id)):
+        match = TRACK_ID.search(row.top_songs_links or '')
+        key = (row.user_id, match.group(1) if match else None)
+        if match is None or key in seen:
+            duplicates.append(row.id)
+        else:
+            seen.add(key)
+            updates.append({'row_id': row.id, 'new_track_id': key[1]})
+    if updates:
+        connection.execute(links.update().where(links.c.id == sa.bindparam('row_id')).values(track_id=sa.bindparam('new_track_id')), updates)
+    if duplicates:
+        connection.execute(links.delete().where(links.c.id.in_(duplicates)))
+
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.alter_column('track_id', existing_type=sa.String(length=64), nullable=False)
+        batch_op.drop_index('ix_saved_top_songs_links_user_id')  # Covered by the unique constraint below
+        batch_op.create_unique_constraint('uq_saved_top_songs_links_user_id_track_id', ['user_id', 'track_id'])
+        batch_op.drop_column('top_songs_links')
+
+
+def downgrade():
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('top_songs_links', sa.Text(), nullable=True))
+
+    connection = op.get_bind()
+    links = sa.table('saved_top_songs_links', sa.column('id', sa.Integer), sa.column('top_songs_links', sa.Text),
+                     sa.column('track_id', sa.String))
+    rows = [{'row_id': row.id, 'link': EMBED_URL.format(row.track_id)} for row in connection.execute(sa.select(links.c.id, links.c.track_id))]
+    if rows:
+        connection.execute(links.update().where(links.c.id == sa.bindparam('row_id')).values(top_songs_links=sa.bindparam('link')), rows)
+
+    with op.batch_alter_table('saved_top_songs_links', schema=None) as batch_op:
+        batch_op.alter_column('top_songs_links', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_constraint('uq_saved_top_songs_links_user_id_track_id', type_='unique')
+        batch_op.create_index('ix_saved_top_songs_links_user_id', ['user_id'], unique=False)
+        batch_op.drop_column('track_id')
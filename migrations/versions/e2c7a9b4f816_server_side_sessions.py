@@ -0,0 +1,36 @@
+"""server-side sessions table
+
+Revision ID: e2c7a9b4f816
+Revises: d4a8e6f1b259
+Create Date: 2026-10-18 15:48:12.403557
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c7a9b4f816'
+down_revision = 'd4a8e6f1b259'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sessions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.String(length=255), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.Column('expiry', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id')
+    )
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sessions_expiry'), ['expiry'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sessions_expiry'))
+
+    op.drop_table('sessions')
@@ -1,6 +1,7 @@
+import os
 from app import create_app
 
-app = create_app()
+app = create_app(os.environ.get('FLASK_CONFIG', 'development'))  # gunicorn.conf.py defaults it to production
 
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,11 @@
+import pytest
+from app import create_app
+from app.extensions import db
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    app.config['SECRET_KEY'] = 'test'
+    with app.app_context():
+        yield app
+        db.session.remove()
@@ -0,0 +1,68 @@
+import gzip, json, os, subprocess, sys
+import pytest
+from app.assets import build_assets, is_immutable, rewrite_html
+
+def make_public(root):
+    (root / 'css').mkdir(parents=True)
+    (root / 'js').mkdir()
+    (root / 'images').mkdir()
+    (root / 'js' / 'app.js').write_text("console.log('hi');\n" * 100, encoding='utf-8')
+    (root / 'images' / 'logo.svg').write_text('<svg xmlns="http://www.w3.org/2000/svg"/>', encoding='utf-8')
+    (root / 'css' / 'site.css').write_text(
+        "body { background: url('../images/logo.svg'); }\n.gone { background: url(../images/missing.jpg); }\n" * 20,
+        encoding='utf-8'
+    )
+    (root / 'index.html').write_text(
+        '<link href="/static/css/site.css" rel="stylesheet"><script src="/js/app.js"></script>'
+        '<img src="/static/images/logo.svg"><a href="/emotions">x</a>',
+        encoding='utf-8'
+    )
+    (root / 'genres.md').write_text("1. Blues\n", encoding='utf-8')
+
+def test_build_fingerprints_compresses_and_rewrites(tmp_path):
+    source, output = tmp_path / 'public', tmp_path / 'build'
+    make_public(source)
+    manifest, _ = build_assets(str(source), str(output))
+
+    assert set(manifest) == {'css/site.css', 'js/app.js', 'images/logo.svg'}
+    js = manifest['js/app.js']
+    assert is_immutable(None, f'/static/{js}') and not is_immutable(None, '/static/js/app.js')
+    assert gzip.decompress((output / f'{js}.gz').read_bytes()) == (source / 'js' / 'app.js').read_bytes()
+    assert (output / 'js' / 'app.js').exists()  # Unhashed copy stays reachable
+    assert not (output / 'images' / 'logo.svg.gz').exists()  # Too small to be worth compressing
+
+    css = (output / manifest['css/site.css']).read_text(encoding='utf-8')
+    assert f"url('../{manifest['images/logo.svg']}')" in css
+    assert 'url(../images/missing.jpg)' in css
+
+    html = (output / 'index.html').read_text(encoding='utf-8')
+    assert f'href="/static/{manifest["css/site.css"]}"' in html
+    assert f'src="/static/{js}"' in html
+    assert 'href="/emotions"' in html
+    assert (output / 'genres.md').exists()
+    assert json.loads((output / 'manifest.json').read_text())['files'] == manifest
+
+def test_rewrite_html_adds_srcset_for_resized_images():
+    manifest = {'images/hero.jpg': 'images/hero.0123456789ab.jpg'}
+    variants = {'images/hero.jpg': [{'width': 480, 'path': 'images/hero-480w.ba9876543210.jpg'}]}
+    html = rewrite_html('<img src="/static/images/hero.jpg" alt="">', manifest, variants)
+
+    assert html == ('<img src="/static/images/hero.0123456789ab.jpg" alt="" '
+                    'srcset="/static/images/hero-480w.ba9876543210.jpg 480w" sizes="100vw">')
+
+def test_build_resizes_large_images(tmp_path):
+    Image = pytest.importorskip('PIL.Image')
+    source, output = tmp_path / 'public', tmp_path / 'build'
+    make_public(source)
+    Image.new('RGB', (1000, 500), 'red').save(source / 'images' / 'hero.jpg')
+    _, variants = build_assets(str(source), str(output), widths=(480, 960, 1600))
+
+    assert [v['width'] for v in variants['images/hero.jpg']] == [480, 960]
+    with Image.open(output / variants['images/hero.jpg'][0]['path']) as image:
+        assert image.size == (480, 240)
+
+def test_importing_the_app_leaves_pillow_unloaded():
+    # brotli is not checked: urllib3 imports it for response decoding when it is installed
+    loaded = subprocess.run([sys.executable, '-c', "import sys, app; print('PIL' in sys.modules)"],
+                            capture_output=True, text=True, check=True, cwd=os.path.join(os.path.dirname(__file__), '..'))
+    assert loaded.stdout.strip() == 'False'
@@ -0,0 +1,48 @@
+import os, subprocess, sys
+from sqlalchemy import inspect
+from app import create_app
+from app import main as main_module
+from app.boot import boot_timer, reinit_after_fork
+from app.extensions import db
+from app.spotify import spotify_clients
+
+def test_boot_phases_are_reported():
+    app = create_app('testing')
+    stats = app.test_client().get('/debug-stats').get_json()['boot']
+
+    assert stats['import_seconds'] > 0
+    assert {'config', 'extensions', 'schema'} <= set(stats['phases'])
+    assert stats['pid'] == os.getpid()
+
+def test_llm_client_is_built_on_first_use():
+    main_module.reset_llm_client()
+    app = create_app('testing')
+    assert main_module._llm_client is None
+
+    with app.app_context():
+        client = main_module.get_llm_client()
+        assert main_module.get_llm_client() is client
+
+def test_llm_libraries_are_not_imported_with_the_app():
+    loaded = subprocess.run([sys.executable, '-c', "import sys, app; print(sorted({'openai', 'httpx'} & set(sys.modules)))"],
+                            capture_output=True, text=True, check=True, cwd=os.path.join(os.path.dirname(__file__), '..'))
+    assert loaded.stdout.strip() == '[]'
+
+def test_schema_creation_can_be_left_to_migrations(monkeypatch):
+    monkeypatch.setattr('app.config.TestingConfig.AUTO_CREATE_SCHEMA', False)
+    app = create_app('testing')
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+    assert 'schema' not in boot_timer.stats()['phases']
+
+def test_forked_worker_drops_inherited_pools():
+    app = create_app('testing')
+    with app.app_context():
+        main_module.get_llm_client()
+    spotify_clients.get('token')
+
+    reinit_after_fork()
+    assert main_module._llm_client is None
+    assert spotify_clients.stats()['clients'] == 0
+    assert boot_timer.stats()['forked'] is True
+    boot_timer.forked = False
@@ -0,0 +1,69 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.cache import TTLCache, SingleFlight
+
+def test_cache_counts_hits_and_misses():
+    cache = TTLCache(maxsize=4, ttl=60)
+    assert cache.get('happy rock') is None
+    cache.set('happy rock', {'playlists': {'items': []}})
+    assert cache.get('happy rock') == {'playlists': {'items': []}}
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # 'b' becomes the coldest entry
+    cache.set('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=0.01)
+    calls = []
+    factory = lambda: calls.append(1) or 'tracks'
+
+    assert cache.get_or_set('playlist', factory) == 'tracks'
+    assert cache.get_or_set('playlist', factory) == 'tracks'
+    time.sleep(0.02)
+    assert cache.get_or_set('playlist', factory) == 'tracks'
+    assert len(calls) == 2
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight, release, calls = SingleFlight(timeout=2), threading.Event(), []
+    def upstream():
+        calls.append(1)
+        release.wait(2)
+        return 'result'
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, 'key', upstream) for _ in range(4)]
+        while flight.stats()['coalesced'] < 3:
+            time.sleep(0.001)
+        release.set()
+        assert [future.result() for future in futures] == ['result'] * 4
+    assert len(calls) == 1
+    assert flight.stats()['in_flight'] == 0
+
+def test_single_flight_shares_errors_and_times_out():
+    flight, release = SingleFlight(), threading.Event()
+    def failing():
+        release.wait(2)
+        raise ValueError('upstream down')
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        leader = pool.submit(flight.do, 'key', failing)
+        while not flight.stats()['in_flight']:
+            time.sleep(0.001)
+        follower = pool.submit(flight.do, 'key', failing)
+        impatient = pool.submit(flight.do, 'key', failing, 0.01)
+        with pytest.raises(TimeoutError):
+            impatient.result()
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.stats()['timeouts'] == 1
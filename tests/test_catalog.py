@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+from app.catalog import ingest_tracks, local_tracks
+from app.models import Song, Emotion
+from app.utils import EMOTION_PROFILES
+
+def spotify_track(i):
+    return {'id': f"track_{i}", 'name': f"Song {i}", 'artists': [{'name': 'Artist'}], 'album': {'name': 'Album'}, 'popularity': i}
+
+def audio_features(ids):
+    return [{'id': track_id, 'danceability': 0.8, 'energy': 0.8, 'key': 5, 'loudness': -7.0, 'mode': 1,
+             'speechiness': 0.05, 'acousticness': 0.2, 'instrumentalness': 0.0, 'liveness': 0.1,
+             'valence': 0.9, 'tempo': 128.0, 'duration_ms': 200000} for track_id in ids]
+
+def test_ingest_skips_known_tracks(app):
+    sp = MagicMock()
+    sp.audio_features.side_effect = audio_features
+    tracks = [spotify_track(i) for i in range(5)]
+
+    assert len(ingest_tracks(sp, tracks, Emotion.JOY, {'track_0': 'Disco'})) == 5
+    assert len(ingest_tracks(sp, tracks + [spotify_track(5)], Emotion.JOY)) == 1
+    assert Song.query.count() == 6
+    assert Song.query.filter_by(spotify_id='track_0').first().genre == 'Disco'
+    assert Song.query.filter_by(spotify_id='track_1').first().key == 'F'
+
+def test_local_tracks_needs_a_warm_pool(app):
+    sp = MagicMock()
+    sp.audio_features.side_effect = audio_features
+    ingest_tracks(sp, [spotify_track(i) for i in range(30)], Emotion.JOY)
+
+    assert local_tracks(Emotion.JOY, min_pool=40) is None
+    assert len(local_tracks(Emotion.JOY, min_pool=25, max_count=20)) == 20
+    assert local_tracks(Emotion.SADNESS, min_pool=1) is None
+    assert local_tracks(Emotion.JOY, genres=['Disco'], min_pool=1) is None
+
+def test_nearest_tracks_returns_the_whole_pool_when_it_is_below_max_count(app):
+    sp = MagicMock()
+    sp.audio_features.side_effect = audio_features
+    ingest_tracks(sp, [spotify_track(i) for i in range(15)], Emotion.JOY)
+
+    assert len(local_tracks(Emotion.JOY, min_pool=10, max_count=20, target=EMOTION_PROFILES[Emotion.JOY])) == 15
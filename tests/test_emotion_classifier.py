@@ -0,0 +1,22 @@
+from app.emotion_classifier import EmotionClassifier, SYNONYMS
+from app.main import emotion_map
+
+def test_synonyms_cover_every_label():
+    assert set(SYNONYMS) == set(emotion_map)
+    assert EmotionClassifier().labels == set(emotion_map)
+
+def test_classifies_english_and_chinese_phrases():
+    classifier = EmotionClassifier()
+    assert classifier.classify('so angry at my boss') == ('Anger', 1.0)
+    assert classifier.classify('I feel calm and peaceful')[0] == 'Mediation'
+    assert classifier.classify('有点紧张不安')[0] == 'Anxiety'
+    assert classifier.classify('我不开心')[0] == 'Low spirits'  # One phrase, not 不 + 开心
+    assert classifier.classify('over the moon') == (None, 0.0)
+
+def test_ambiguous_or_negated_text_defers_to_the_llm():
+    classifier = EmotionClassifier(threshold=0.6)
+    assert classifier.resolve('happy and excited') is None
+    assert classifier.resolve('not happy') is None
+    assert classifier.resolve('我不高兴') is None
+    assert classifier.resolve('terrified') == 'Fear'
+    assert classifier.stats()['llm_skip_rate'] == 0.25
@@ -0,0 +1,20 @@
+from app.emotion_labels import LabelResolver, normalize
+from app.main import classify_emotion, emotion_map
+
+def test_normalize_strips_quotes_punctuation_and_prefixes():
+    assert normalize('  "Tender feelings." ') == 'tender feelings'
+    assert normalize('Emotion: Ill-temper') == 'ill temper'
+
+def test_resolves_model_outputs_to_canonical_labels():
+    resolver = LabelResolver()
+    assert set(resolver.labels) == set(emotion_map)
+    assert resolver.resolve('Meditation') == ('Mediation', 1.0)
+    assert resolver.resolve("'grief'\n") == ('Grief', 1.0)
+    assert resolver.resolve('The emotion is Despair.') == ('Despair', 0.9)
+    label, confidence = resolver.resolve('Helplesness')
+    assert label == 'Helplessness' and 0.5 < confidence < 1
+    assert resolver.canonical('banana') is None
+
+def test_classify_emotion_no_longer_falls_to_sadness_on_sloppy_labels():
+    assert classify_emotion('"high spirits."') == 'JOY'
+    assert classify_emotion('meditation') == 'TENDER'
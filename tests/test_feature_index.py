@@ -0,0 +1,56 @@
+import numpy as np
+from app.feature_index import FeatureIndex, INDEX_FEATURES
+from app.models import Emotion
+from app.utils import EMOTION_PROFILES
+
+def brute_force(points, lower, upper, k):
+    gap = np.maximum(np.maximum(lower - points, points - upper), 0)
+    distances = (gap ** 2).sum(axis=1)
+    return sorted(distances)[:k]
+
+def test_nearest_matches_a_linear_scan():
+    rng = np.random.default_rng(3)
+    points = rng.random((3000, len(INDEX_FEATURES)))
+    index = FeatureIndex()
+    index.build((f"t{i}", point) for i, point in enumerate(points[:2000]))
+    for i, point in enumerate(points[2000:], start=2000):
+        index.insert(f"t{i}", point)  # Incremental inserts split leaves as they fill up
+
+    assert len(index) == 3000
+    for emotion in Emotion:
+        lower, upper = FeatureIndex.target_box(EMOTION_PROFILES[emotion])
+        hits = index.nearest(lower, upper, k=20)
+        assert np.allclose([distance for distance, _ in hits], brute_force(points, lower, upper, 20))
+
+def test_strict_query_respects_attribute_ranges():
+    rng = np.random.default_rng(5)
+    points = rng.random((1000, len(INDEX_FEATURES)))
+    index = FeatureIndex()
+    index.build((i, point) for i, point in enumerate(points))
+    lower, upper = FeatureIndex.target_box(EMOTION_PROFILES[Emotion.TENDER])
+    ranged = upper > lower
+
+    for _, i in index.nearest(lower, upper, k=15, strict=True):
+        assert ((points[i] >= lower) & (points[i] <= upper))[ranged].all()
+
+def test_duplicates_and_incomplete_vectors_are_skipped():
+    index = FeatureIndex()
+    assert index.insert('a', np.zeros(len(INDEX_FEATURES)))
+    assert not index.insert('a', np.ones(len(INDEX_FEATURES)))
+    assert not index.insert('b', np.full(len(INDEX_FEATURES), np.nan))
+    assert len(index) == 1
+
+def test_inserts_after_a_query_are_found_without_rebuilding_the_table():
+    rng = np.random.default_rng(7)
+    points = rng.random((2100, len(INDEX_FEATURES)))
+    index = FeatureIndex()
+    index.build((f"t{i}", point) for i, point in enumerate(points[:2000]))
+    lower, upper = FeatureIndex.target_box(EMOTION_PROFILES[Emotion.JOY])
+    index.nearest(lower, upper)
+    table = index._table
+
+    for i, point in enumerate(points[2000:], start=2000):
+        index.insert(f"t{i}", point)
+        hits = index.nearest(lower, upper, k=20)
+        assert np.allclose([distance for distance, _ in hits], brute_force(points[:i + 1], lower, upper, 20))
+    assert index._table is table
@@ -0,0 +1,49 @@
+import os
+from app.genres import GenreCatalog
+
+def write_genres(path, genres):
+    path.write_text(''.join(f"1. {genre}\n" for genre in genres), encoding='utf-8')
+
+def test_catalog_parses_numbered_lines(tmp_path):
+    path = tmp_path / 'genres.md'
+    path.write_text("1. Acid Jazz\n\n1. Zydeco\nnot a genre\n", encoding='utf-8')
+    catalog = GenreCatalog(str(path))
+
+    assert catalog.genres == ('Acid Jazz', 'Zydeco')
+    assert 'Zydeco' in catalog
+    assert set(catalog.sample(5)) == {'Acid Jazz', 'Zydeco'}
+
+def test_catalog_reloads_when_checksum_changes(tmp_path):
+    path = tmp_path / 'genres.md'
+    write_genres(path, ['Blues', 'Jazz'])
+    catalog = GenreCatalog(str(path), reload_interval=0)
+    first_checksum = catalog.refresh(force=True) and catalog.checksum
+
+    write_genres(path, ['Blues', 'Jazz', 'Soul'])
+    os.utime(path, ns=(0, 0))
+    assert catalog.refresh() is True
+    assert catalog.checksum != first_checksum
+    assert len(catalog) == 3
+
+    os.utime(path, ns=(1, 1))  # Touched without changing the content
+    assert catalog.refresh() is False
+
+def test_default_catalog_is_loaded():
+    catalog = GenreCatalog(os.path.join(os.path.dirname(__file__), '..', 'public', 'genres.md'))
+    assert len(catalog) > 1000
+
+def test_update_genres_applies_only_the_difference(app):
+    from app.extensions import db
+    from app.models import User, UserGenre
+    db.session.add(User(user_id='u1'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+
+    assert client.post('/update-genres', json={'genres': ['rock', 'pop', 'rock']}).status_code == 200
+    kept = UserGenre.query.filter_by(genre='rock').one().id
+    assert client.post('/update-genres', json={'genres': ['rock', 'jazz']}).status_code == 200
+
+    assert client.get('/genres').get_json() == {'genres': ['rock', 'jazz']}
+    assert UserGenre.query.filter_by(genre='rock').one().id == kept  # Untouched, not deleted and re-added
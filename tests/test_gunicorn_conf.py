@@ -0,0 +1,23 @@
+import os, runpy
+
+CONF = os.path.join(os.path.dirname(__file__), '..', 'gunicorn.conf.py')
+
+def test_threaded_workers_sized_from_environment(monkeypatch):
+    monkeypatch.setenv('WEB_CONCURRENCY', '3')
+    monkeypatch.setenv('GUNICORN_THREADS', '12')
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    monkeypatch.setenv('SPOTIFY_POOL_SIZE', '')
+    monkeypatch.delenv('SPOTIFY_POOL_SIZE')  # Restored after the test; the config sets it
+    monkeypatch.setenv('PLAYLIST_FANOUT_WORKERS', '4')
+    for name in ('FLASK_CONFIG', 'DB_MAX_CONNECTIONS', 'DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'LLM_CALL_WORKERS'):
+        monkeypatch.setenv(name, '')
+        monkeypatch.delenv(name)
+    conf = runpy.run_path(CONF)
+
+    assert (conf['worker_class'], conf['workers'], conf['threads']) == ('gthread', 3, 12)
+    assert os.environ['FLASK_CONFIG'] == 'production'
+    assert (os.environ['DB_POOL_SIZE'], os.environ['DB_MAX_OVERFLOW']) == ('3', '2')  # 16 connections over 3 workers
+    assert os.environ['LLM_CALL_WORKERS'] == '24'
+    assert conf['preload_app'] is True
+    assert os.environ['SPOTIFY_POOL_SIZE'] == '12'
+    assert os.environ['PLAYLIST_FANOUT_WORKERS'] == '4'  # Explicit settings win
@@ -0,0 +1,106 @@
+import threading, time
+import pytest
+from unittest.mock import patch
+from app.extensions import db
+from app.jobs import JobQueue, QueueFull
+from app.main import PlaylistError
+from app.models import User
+from app.utils import song_from_item
+
+def wait_done(queue, job):
+    current, _ = queue.wait(job.id, since=10**6, timeout=5)
+    assert current.finished
+    return current
+
+def test_job_records_stages_and_result(app):
+    queue = JobQueue()
+    job = queue.submit(lambda n: iter([('a', {'x': n}), ('b', {'y': 2})]), 1)
+    job = wait_done(queue, job)
+
+    assert job.to_dict() == {'job_id': job.id, 'status': 'done', 'stages': ['a', 'b'], 'result': {'x': 1, 'y': 2}, 'error': None}
+    assert queue.stats()['completed'] == 1
+
+def test_failed_job_keeps_the_error_status(app):
+    def run():
+        yield 'emotion', {'emotion': 'Joy'}
+        raise PlaylistError('No tracks found', 404)
+    queue = JobQueue()
+    job = wait_done(queue, queue.submit(run))
+
+    assert (job.status, job.error, job.error_status) == ('failed', 'No tracks found', 404)
+    assert job.result == {'emotion': 'Joy'}
+
+def test_queue_rejects_work_beyond_max_pending(app):
+    release = threading.Event()
+    def run():
+        release.wait(5)
+        yield 'done', {}
+    queue = JobQueue()
+    queue.max_workers = queue.max_pending = 1
+    job = queue.submit(run)
+    with pytest.raises(QueueFull):
+        queue.submit(run)
+    release.set()
+    wait_done(queue, job)
+    assert queue.stats()['rejected'] == 1
+
+def test_persisted_job_is_visible_to_other_workers(app):
+    queue, other_worker = JobQueue(), JobQueue()
+    queue.persist = other_worker.persist = True
+    job = wait_done(queue, queue.submit(lambda: iter([('playlist', {'playlist_id': 'p1'})]), owner='u1'))
+
+    seen = other_worker.get(job.id)
+    assert (seen.owner, seen.status, seen.result) == ('u1', 'done', {'playlist_id': 'p1'})
+
+def test_enqueue_returns_202_and_streams_stages(app):
+    db.session.add(User(user_id='u1'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+        session['token_info'] = {'access_token': 'token'}
+    tracks = [song_from_item({'track': {'id': f't{i}', 'name': 'Song', 'artists': [{'name': 'A'}], 'album': {'name': 'B'},
+                                        'popularity': i}}) for i in range(3)]
+    stages = [('candidates', tracks), ('playlist', 'p1'), ('top_tracks', tracks[:1])]
+
+    with patch('app.main.get_token', return_value='token'), patch('app.main.playlist_stages', return_value=iter(stages)):
+        response = client.post('/api/playlist_jobs', json={'emotion': 'Joy'})
+        assert response.status_code == 202
+        body = response.get_json()
+        events = client.get(body['events_url']).get_data(as_text=True)
+
+    assert [line for line in events.splitlines() if line.startswith('id: ')] == ['id: 1', 'id: 2', 'id: 3', 'id: 4']
+    assert 'event: done' in events
+    status = client.get(body['status_url']).get_json()
+    assert status['stages'] == ['emotion', 'candidates', 'playlist', 'top_tracks']
+    assert status['result']['playlist_id'] == 'p1'
+
+    with client.session_transaction() as session:
+        session['user_id'] = 'someone-else'
+    assert client.get(body['status_url']).status_code == 404
+
+def test_failed_insert_gives_the_slot_back(app):
+    queue = JobQueue()
+    queue.persist, queue.max_pending = True, 1
+    with patch.object(JobQueue, '_save', side_effect=RuntimeError('db down')):
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                queue.submit(lambda: iter([]))
+    assert queue.stats()['pending'] == 0 and queue.stats()['tracked'] == 0
+
+    job = wait_done(queue, queue.submit(lambda: iter([('a', {})])))
+    assert job.status == 'done'
+
+def test_waiters_are_woken_when_the_row_cannot_be_written(app):
+    queue = JobQueue()
+    queue.persist = True
+    saves = []
+    def save(job, created=False):
+        saves.append(job.status)
+        if not created:
+            raise RuntimeError('db down')
+    with patch.object(queue, '_save', side_effect=save):
+        started = time.monotonic()
+        job = wait_done(queue, queue.submit(lambda: iter([])))
+    assert job.status == 'failed' and time.monotonic() - started < 2
+    assert queue.stats()['pending'] == 0
@@ -0,0 +1,40 @@
+import json
+import pytest
+from unittest.mock import patch
+from app.utils import song_from_item
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+        session['token_info'] = {'access_token': 'token'}
+    with patch('app.main.get_token', return_value='token'):
+        yield client
+
+def stream_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_stages_are_streamed_as_ndjson(client):
+    tracks = [song_from_item({'track': {'id': f't{i}', 'name': 'Song', 'artists': [{'name': 'A'}], 'album': {'name': 'B'},
+                                        'popularity': i}}) for i in range(3)]
+    stages = [('candidates', tracks), ('playlist', 'p1'), ('top_tracks', tracks[-1:])]
+    with patch('app.main.playlist_stages', return_value=iter(stages)):
+        response = client.post('/api/create_playlist/stream', json={'emotion': 'Joy'})
+        lines = stream_lines(response)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [line['stage'] for line in lines] == ['emotion', 'candidates', 'playlist', 'top_tracks']
+    assert lines[1]['candidates'] == 3
+    assert 'embed/playlist/p1' in lines[2]['embedded_playlist_code']
+    assert 'embed/track/t2' in lines[3]['top_tracks_embedded'][0]
+
+def test_failure_after_the_first_stage_is_the_last_line(client):
+    with patch('app.main.playlist_stages', return_value=iter([])):
+        lines = stream_lines(client.post('/api/create_playlist/stream', json={'emotion': 'Joy'}))
+    assert lines[-1] == {'stage': 'error', 'error': 'No tracks found for emotion: JOY', 'status': 404}
+
+def test_invalid_emotion_is_a_plain_400(client):
+    response = client.post('/api/create_playlist/stream', json={'emotion': 'qqqq'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid emotion'}
@@ -0,0 +1,109 @@
+import asyncio, time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from app import main as main_module
+from app.main import refine_cache, refine_cache_key
+from app.llm import AsyncLLMClient
+from app.resilience import llm_guard
+
+@pytest.fixture
+def client(app):
+    refine_cache.clear()
+    llm_guard.breaker.record_success(0)
+    with app.test_client() as client:
+        yield client
+
+def test_cache_key_normalizes_detail():
+    assert refine_cache_key('Joy', '  Feeling   GREAT today ') == refine_cache_key('joy', 'feeling great today')
+    assert refine_cache_key('Joy', 'feeling great') != refine_cache_key('Anger', 'feeling great')
+
+def test_repeat_classification_skips_the_llm(client):
+    with patch('app.main.request_refinement', return_value='High spirits') as request_refinement:
+        for detail in ('Over the moon', 'over   the MOON'):
+            response = client.post('/api/refineEmotion', json={'mainEmotion': 'Joy', 'emotionDetail': detail})
+            assert response.get_json() == {'refinedEmotion': 'High spirits'}
+    assert request_refinement.call_count == 1
+
+def test_invalid_labels_are_not_cached(client):
+    with patch('app.main.request_refinement', return_value='Happiness, probably') as request_refinement:
+        for _ in range(2):
+            client.post('/api/refineEmotion', json={'mainEmotion': 'Joy', 'emotionDetail': 'hmm'})
+    assert request_refinement.call_count == 2
+
+def test_async_route_shares_the_cache(client):
+    async def complete(timeout=None, **kwargs):
+        return 'Grief'
+    with patch('app.main.async_llm.complete', side_effect=complete) as complete_mock:
+        for _ in range(2):
+            response = client.post('/api/refineEmotion/async', json={'mainEmotion': 'Sadness', 'emotionDetail': 'lost my dog'})
+            assert response.get_json() == {'refinedEmotion': 'Grief'}
+    assert complete_mock.call_count == 1
+
+def test_async_route_cancels_slow_calls(client):
+    client.application.config['LLM_REQUEST_TIMEOUT'] = 0.05
+    cancelled = []
+    async def slow(self, **kwargs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    with patch.object(AsyncLLMClient, '_complete', slow):
+        response = client.post('/api/refineEmotion/async', json={'mainEmotion': 'Joy', 'emotionDetail': 'slow'})
+        time.sleep(0.05)
+
+    assert response.status_code == 504
+    assert cancelled == [True]
+
+def test_async_client_coalesces_identical_requests():
+    llm, calls = AsyncLLMClient(), []
+    llm.api_key = 'test-key'
+    async def upstream(self, **kwargs):
+        calls.append(kwargs)
+        await asyncio.sleep(0.05)
+        return 'Joy'
+    async def ask_twice():
+        return await asyncio.gather(*(llm.complete(timeout=2, key='same', model='m') for _ in range(2)))
+    with patch.object(AsyncLLMClient, '_complete', upstream):
+        assert asyncio.run(ask_twice()) == ['Joy', 'Joy']
+    assert len(calls) == 1 and llm.stats()['coalesced'] == 1
+    llm.reset()
+
+def test_confident_local_classification_skips_the_llm(client):
+    with patch('app.main.request_refinement') as request_refinement:
+        for detail in ('I have been crying all night', '我今天很开心'):
+            response = client.post('/api/refineEmotion', json={'mainEmotion': 'Sadness', 'emotionDetail': detail})
+            assert response.get_json()['refinedEmotion'] in ('Weeping', 'Joy')
+    request_refinement.assert_not_called()
+
+def test_llm_output_is_snapped_to_a_label(client):
+    with patch('app.main.request_refinement', return_value='"Meditation."') as request_refinement:
+        for _ in range(2):
+            response = client.post('/api/refineEmotion', json={'mainEmotion': 'Joy', 'emotionDetail': 'om'})
+            assert response.get_json() == {'refinedEmotion': 'Mediation'}
+    assert request_refinement.call_count == 1
+
+def test_unrecognized_llm_output_falls_back_to_main_emotion(client):
+    with patch('app.main.request_refinement', return_value='I cannot tell'):
+        response = client.post('/api/refineEmotion', json={'mainEmotion': 'fear', 'emotionDetail': 'hmm'})
+    assert response.get_json() == {'refinedEmotion': 'Fear'}
+
+def test_open_breaker_falls_back_to_the_main_emotion(client):
+    with patch.object(llm_guard.breaker, 'allow', return_value=False), patch('app.main.request_refinement') as request_refinement:
+        for route in ('/api/refineEmotion', '/api/refineEmotion/async'):
+            response = client.post(route, json={'mainEmotion': 'anger', 'emotionDetail': 'whatever'})
+            assert response.get_json() == {'refinedEmotion': 'Anger'}
+    request_refinement.assert_not_called()
+
+def test_sync_route_calls_the_llm_client_off_the_request_thread(client):
+    openai_client = MagicMock()
+    openai_client.chat.completions.create.return_value = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='Grief'))])
+    main_module.reset_llm_client()
+    with patch('openai.OpenAI', return_value=openai_client):
+        response = client.post('/api/refineEmotion', json={'mainEmotion': 'Sadness', 'emotionDetail': 'lost my dog'})
+    main_module.reset_llm_client()
+
+    assert response.status_code == 200
+    assert response.get_json() == {'refinedEmotion': 'Grief'}
+    assert openai_client.chat.completions.create.call_count == 1
@@ -0,0 +1,110 @@
+import asyncio, threading, time
+import pytest
+from app.resilience import CircuitBreaker, ResilientCaller, CircuitOpenError, DeadlineExceeded
+
+def failing():
+    raise ConnectionError('upstream down')
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_cool_down():
+    caller = ResilientCaller(name='test')
+    caller.hedge_enabled = False
+    caller.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            caller.call(failing)
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda: 'unused')
+
+    time.sleep(0.06)
+    assert caller.call(lambda: 'ok') == 'ok'  # The half-open probe succeeds and closes the circuit
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+def test_slow_successes_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, latency_slo=0.5)
+    breaker.record_success(1.0)
+    breaker.record_success(1.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_deadline_bounds_a_hung_call():
+    caller = ResilientCaller(name='test')
+    caller.hedge_enabled = False
+    release = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda: release.wait(2), deadline=0.05)
+    assert time.monotonic() - start < 0.5
+    release.set()
+
+def test_hedged_request_wins_when_the_first_one_stalls():
+    caller = ResilientCaller(name='test')
+    caller.hedge_min_samples, caller.hedge_min_delay = 1, 0.02
+    caller.latency.add(0.01)
+    release, attempts = threading.Event(), []
+    def upstream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            release.wait(2)  # The first attempt hangs
+            return 'slow'
+        return 'fast'
+    assert caller.call(upstream, deadline=1) == 'fast'
+    assert caller.hedged == 1 and caller.hedge_wins == 1
+    release.set()
+
+def test_time_queued_for_a_call_slot_is_not_held_against_the_upstream():
+    caller = ResilientCaller(name='test')
+    caller.hedge_enabled, caller.max_workers = False, 1
+    caller.breaker = CircuitBreaker(failure_threshold=1, latency_slo=0.1)
+    release = threading.Event()
+    busy = threading.Thread(target=lambda: caller.call(lambda: release.wait(0.3), deadline=2))
+    busy.start()
+    time.sleep(0.02)
+
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda: 'never started', deadline=0.05)  # The only slot is taken
+    assert caller.breaker.state == CircuitBreaker.CLOSED and caller.queue_timeouts == 1
+
+    caller.breaker.failure_threshold = 2  # The busy call itself breaches the SLO once
+    assert caller.call(lambda: 'queued', deadline=1) == 'queued'  # Waits ~0.25s for the slot, then answers at once
+    busy.join()
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+class BadRequest(Exception):
+    status_code = 400
+
+def test_calls_that_never_reach_a_verdict_release_the_half_open_probe():
+    caller = ResilientCaller(name='test')
+    caller.hedge_enabled, caller.max_workers = False, 1
+    caller.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    with pytest.raises(ConnectionError):
+        caller.call(failing)
+    assert caller.breaker.state == CircuitBreaker.OPEN
+
+    release = threading.Event()
+    caller._get_executor().submit(release.wait, 2)  # Occupies the only call slot
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda: 'never started', deadline=0.05)  # Admitted as the half-open probe
+    release.set()
+
+    async def cancelled():
+        raise asyncio.CancelledError
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(caller.acall(cancelled))
+
+    assert caller.call(lambda: 'ok') == 'ok'  # Still allowed to probe, and the probe closes the circuit
+    assert caller.breaker.state == CircuitBreaker.CLOSED
+
+def test_client_errors_are_neither_retried_nor_held_against_the_upstream():
+    caller = ResilientCaller(name='test')
+    caller.hedge_min_samples, caller.hedge_min_delay = 1, 0.01
+    caller.latency.add(0.01)
+    caller.breaker = CircuitBreaker(failure_threshold=1)
+    attempts = []
+    def rejected():
+        attempts.append(1)
+        raise BadRequest('content filter')
+
+    for _ in range(3):
+        with pytest.raises(BadRequest):
+            caller.call(rejected, deadline=1)
+    assert len(attempts) == 3 and caller.hedged == 0
+    assert caller.breaker.state == CircuitBreaker.CLOSED and caller.client_errors == 3
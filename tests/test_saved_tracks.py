@@ -0,0 +1,71 @@
+import pytest
+from app.extensions import db
+from app.models import User, SavedTopSongsLinks
+
+@pytest.fixture
+def client(app):
+    db.session.add(User(user_id='u1'))
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+    yield client
+
+def test_saving_a_track_twice_is_idempotent(client):
+    link = '<iframe src="https://open.spotify.com/embed/track/4uLU6hMCjMI75M1A2tKUQC" width="300"></iframe>'
+    for _ in range(2):
+        assert client.post('/api/save_top_song', json={'link': link}).status_code == 201
+    saved = SavedTopSongsLinks.query.all()
+    assert [(s.user_id, s.track_id) for s in saved] == [('u1', '4uLU6hMCjMI75M1A2tKUQC')]
+
+def test_saved_tracks_are_paginated_by_cursor(client):
+    db.session.add_all(SavedTopSongsLinks('u1', f'track{i}') for i in range(5))
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/get_saved_tracks', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        seen += [track['track_id'] for track in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == [f'track{i}' for i in range(5)]
+    assert response.get_json()[0]['track_link'] == 'https://open.spotify.com/embed/track/track4?utm_source=generator'
+
+def test_unchanged_page_revalidates_with_304(client):
+    db.session.add(SavedTopSongsLinks('u1', 'track0'))
+    db.session.commit()
+    etag = client.get('/api/get_saved_tracks').headers['ETag']
+    assert client.get('/api/get_saved_tracks', headers={'If-None-Match': etag}).status_code == 304
+
+    db.session.add(SavedTopSongsLinks('u1', 'track1'))
+    db.session.commit()
+    assert client.get('/api/get_saved_tracks', headers={'If-None-Match': etag}).status_code == 200
+
+def test_batch_save_reports_a_result_per_item(client):
+    first, second = '4uLU6hMCjMI75M1A2tKUQC', '0VjIjW4GlUZAMYd2vXMi3b'
+    client.post('/api/save_top_song', json={'link': f'https://open.spotify.com/track/{first}'})
+
+    response = client.post('/api/save_top_songs', json={'links': [
+        f'<iframe src="https://open.spotify.com/embed/track/{first}"></iframe>',
+        f'spotify:track:{second}',
+        second,
+        'https://example.com/not-a-track'
+    ]})
+    assert response.status_code == 201
+    assert response.get_json() == {'saved': 1, 'results': [
+        {'track_id': first, 'status': 'already_saved'},
+        {'track_id': second, 'status': 'saved'},
+        {'track_id': second, 'status': 'duplicate'},
+        {'track_id': None, 'status': 'invalid'}
+    ]}
+    assert sorted(s.track_id for s in SavedTopSongsLinks.query.all()) == sorted([first, second])
+
+def test_batch_save_rejects_non_lists(client):
+    assert client.post('/api/save_top_songs', json={'links': 'abc'}).status_code == 400
+
+def test_batch_save_is_capped_by_its_own_setting(client):
+    client.application.config.update(MAX_TOP_SONGS_BATCH=2, MAX_SONGS_PER_PAGE=100)
+    response = client.post('/api/save_top_songs', json={'links': ['a' * 22, 'b' * 22, 'c' * 22]})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'At most 2 links per request'}
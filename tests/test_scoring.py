@@ -0,0 +1,37 @@
+import numpy as np
+from app import scoring
+from app.models import Song, Emotion
+from app.utils import EMOTION_PROFILES, rank_tracks
+
+def song(spotify_id, popularity, **features):
+    return Song(spotify_id=spotify_id, title=spotify_id, artist='Artist', popularity=popularity, **features)
+
+def test_feature_matrix_scales_and_marks_missing_values():
+    matrix = scoring.feature_matrix([song('a', 50, loudness=-30, tempo=125), song('b', 100)])
+
+    assert matrix.shape == (2, len(scoring.FEATURES))
+    assert matrix.flags['C_CONTIGUOUS']
+    assert matrix[0, scoring.FEATURE_INDEX['loudness']] == 0.5
+    assert matrix[0, scoring.FEATURE_INDEX['tempo']] == 0.5
+    assert np.isnan(matrix[1, scoring.FEATURE_INDEX['energy']])
+
+def test_tracks_without_features_rank_by_popularity():
+    tracks = [song(f"t{i}", popularity) for i, popularity in enumerate([10, 90, 40, 70, 20, 60])]
+    assert [track.spotify_id for track in rank_tracks(tracks, limit=3)] == ['t1', 't3', 't5']
+
+def test_emotion_profile_prefers_matching_tracks():
+    joyful = song('joyful', 50, danceability=0.8, energy=0.8, valence=0.9, acousticness=0.2, loudness=-7, tempo=130, instrumentalness=0.1, liveness=0.1, speechiness=0.05)
+    gloomy = song('gloomy', 60, danceability=0.3, energy=0.3, valence=0.1, acousticness=0.6, loudness=-20, tempo=60, instrumentalness=0.1, liveness=0.1, speechiness=0.05)
+
+    assert rank_tracks([gloomy, joyful], limit=1, emotion=Emotion.JOY)[0] is joyful
+    assert rank_tracks([joyful, gloomy], limit=1, emotion=Emotion.SADNESS)[0] is gloomy
+
+def test_top_k_matches_a_full_sort():
+    rng = np.random.default_rng(7)
+    tracks = [song(f"t{i}", int(p), danceability=d, energy=e, valence=v)
+              for i, (p, d, e, v) in enumerate(zip(rng.integers(0, 100, 500), rng.random(500), rng.random(500), rng.random(500)))]
+    profile = EMOTION_PROFILES[Emotion.TENDER]
+    scores = scoring.score_matrix(scoring.feature_matrix(tracks), profile)
+
+    expected = [tracks[i] for i in np.argsort(-scores, kind='stable')[:10]]
+    assert scoring.top_k(tracks, k=10, profile=profile) == expected
@@ -0,0 +1,92 @@
+import pickle
+from datetime import timedelta
+import pytest
+from app.extensions import db
+from app.models import ServerSession
+from app.sessions import server_sessions, _utcnow
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    server_sessions.cache.clear()
+
+def test_cookie_only_carries_a_session_id(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+        session['token_info'] = {'access_token': 'a' * 300, 'refresh_token': 'r' * 300}
+
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+    assert len(cookie.value) < 64
+    assert ServerSession.query.count() == 1
+    assert client.get('/genres').get_json() == {'genres': []}  # Logged in through the stored session
+
+def test_unchanged_sessions_are_read_from_cache_and_not_rewritten(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+    writes = server_sessions.writes
+    for _ in range(3):
+        client.get('/genres')
+    assert server_sessions.writes == writes
+    assert server_sessions.cache.stats()['hits'] >= 3
+
+def test_signout_deletes_the_stored_session(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+    client.post('/signout')
+    assert ServerSession.query.count() == 0
+    assert client.get('/genres').status_code == 403
+
+def test_cleanup_removes_expired_rows(app):
+    db.session.add(ServerSession(session_id='session:old', data=b'', expiry=_utcnow() - timedelta(days=1)))
+    db.session.add(ServerSession(session_id='session:new', data=b'', expiry=_utcnow() + timedelta(days=1)))
+    db.session.commit()
+    assert server_sessions.cleanup_expired(force=True) == 1
+    assert [row.session_id for row in ServerSession.query.all()] == ['session:new']
+
+@pytest.mark.parametrize('data', [b'', b'\x80\x04\x95', b'garbage', pickle.dumps(1)[:-1]])
+def test_unreadable_rows_become_empty_sessions(app, data):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 'u1'
+    ServerSession.query.update({'data': data})
+    db.session.commit()
+    server_sessions.cache.clear()
+
+    assert client.get('/genres').status_code == 403  # Logged out, not a 500
+
+def stored_session(sid, values, version=1):
+    db.session.add(ServerSession(session_id=f'session:{sid}', data=pickle.dumps(values), expiry=_utcnow() + timedelta(days=1), version=version))
+    db.session.commit()
+    return server_sessions.fetch_session(sid)
+
+def test_session_deleted_by_another_worker_is_not_written_back(app):
+    session = stored_session('abc', {'user_id': 'u1'})
+    ServerSession.query.delete()  # Signed out on another worker
+    db.session.commit()
+
+    session['emotion'] = 'Joy'
+    assert server_sessions._store('session:abc', session, _utcnow() + timedelta(days=1)) is False
+    assert ServerSession.query.count() == 0
+    assert server_sessions.fetch_session('abc').get('user_id') is None
+
+def test_concurrent_writes_are_merged_not_overwritten(app):
+    session = stored_session('abc', {'user_id': 'u1', 'emotion': 'Fear'})
+    ServerSession.query.update({'data': pickle.dumps({'user_id': 'u1', 'emotion': 'Fear', 'selectedGenres': ['rock']}),
+                                'version': 2})  # Another worker saved first
+    db.session.commit()
+
+    session['emotion'] = 'Joy'
+    assert server_sessions._store('session:abc', session, _utcnow() + timedelta(days=1)) is True
+    row = db.session.execute(db.select(ServerSession)).scalar_one()
+    db.session.refresh(row)
+    assert pickle.loads(row.data) == {'user_id': 'u1', 'emotion': 'Joy', 'selectedGenres': ['rock']}
+    assert row.version == 3 and server_sessions.stats()['write_conflicts'] >= 1
+
+def test_cached_session_is_checked_against_the_row(app):
+    stored_session('abc', {'user_id': 'u1'})
+    assert server_sessions.fetch_session('abc')['user_id'] == 'u1'  # Served from the cache
+    ServerSession.query.delete()
+    db.session.commit()
+    assert 'user_id' not in server_sessions.fetch_session('abc')
@@ -0,0 +1,30 @@
+from app.spotify import SpotifyClientRegistry
+
+def test_registry_reuses_clients_per_token():
+    registry = SpotifyClientRegistry()
+    first = registry.get('token-a')
+
+    assert registry.get('token-a') is first
+    assert registry.get('token-b') is not first
+    assert registry.get('token-b')._session is first._session  # One shared connection pool
+
+    stats = registry.stats()
+    assert (stats['client_hits'], stats['client_misses'], stats['clients']) == (2, 2, 2)
+
+def test_registry_evicts_idle_and_excess_clients():
+    registry = SpotifyClientRegistry(idle_timeout=0)
+    registry.get('token-a')
+    registry.get('token-b')
+    assert registry.stats()['clients'] == 1
+
+    registry = SpotifyClientRegistry(max_clients=2)
+    for token in ('a', 'b', 'c'):
+        registry.get(token)
+    assert registry.stats()['clients'] == 2
+    assert registry.evictions == 1
+
+def test_reset_drops_the_pool():
+    registry = SpotifyClientRegistry()
+    session = registry.get('token-a')._session
+    registry.reset()
+    assert registry.get('token-a')._session is not session
@@ -0,0 +1,57 @@
+import threading, time
+from unittest.mock import MagicMock, patch
+from app import db
+from app.models import User
+from app.tokens import TokenManager
+
+def add_user(expires_in):
+    user = User(user_id='listener', display_name='Listener')
+    db.session.add(user)
+    TokenManager.store(user, {'access_token': 'old', 'refresh_token': 'refresh', 'expires_at': int(time.time()) + expires_in})
+
+def test_concurrent_refreshes_collapse_into_one(app):
+    add_user(expires_in=10)
+    manager = TokenManager(refresh_margin=60)
+    oauth = MagicMock()
+    def refresh_access_token(refresh_token):
+        time.sleep(0.05)
+        return {'access_token': 'new', 'expires_at': int(time.time()) + 3600}
+    oauth.refresh_access_token.side_effect = refresh_access_token
+
+    results = []
+    def worker():
+        with app.app_context():
+            results.append(manager.refresh('listener')['access_token'])
+
+    with patch.object(TokenManager, '_oauth', return_value=oauth):
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert results == ['new'] * 4
+    assert oauth.refresh_access_token.call_count == 1
+    assert User.query.filter_by(user_id='listener').first().refresh_token == 'refresh'
+
+def test_token_close_to_expiry_is_refreshed_in_background(app):
+    add_user(expires_in=600)
+    manager = TokenManager(refresh_margin=60, refresh_ahead=1440)
+
+    with patch.object(manager, 'schedule_refresh') as schedule_refresh:
+        token_info = manager.get_token_info('listener')
+
+    assert token_info['access_token'] == 'old'  # Still valid, returned without waiting
+    schedule_refresh.assert_called_once_with('listener')
+
+def test_background_refresh_of_a_fresh_row_is_not_counted(app):
+    add_user(expires_in=3600)
+    manager = TokenManager(refresh_ahead=1440, lock_stripes=4)
+    oauth = MagicMock()
+
+    with patch.object(TokenManager, '_oauth', return_value=oauth):
+        manager._refresh_in_background(app, 'listener')  # Another worker already refreshed it
+
+    oauth.refresh_access_token.assert_not_called()
+    assert manager.stats()['background_refreshes'] == 0
+    assert len(manager._locks) == 4
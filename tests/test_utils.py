@@ -0,0 +1,68 @@
+import time
+import pytest
+from flask import Flask
+from unittest.mock import MagicMock, patch
+from app.models import Emotion
+from app.utils import fan_out_candidates, build_playlist, get_random_tracks, song_from_item, search_cache, playlist_tracks_cache
+
+def playlist_page(prefix, count):
+    return {'items': [{'track': {'id': f"{prefix}_{i}", 'name': f"Song {i}", 'artists': [{'name': 'Artist'}],
+                                 'album': {'name': 'Album'}, 'popularity': i}} for i in range(count)]}
+
+@pytest.fixture
+def app_context():
+    app = Flask(__name__)
+    with app.app_context():
+        search_cache.clear()
+        playlist_tracks_cache.clear()
+        yield
+
+def test_fan_out_merges_candidates_across_playlists(app_context):
+    sp = MagicMock()
+    sp.search.side_effect = lambda q, type, limit: {'playlists': {'items': [{'id': f"{q}-1"}, None, {'id': f"{q}-2"}]}}
+    sp.playlist_tracks.side_effect = lambda playlist_id: playlist_page(playlist_id, 3)
+
+    candidates = fan_out_candidates(sp, ['happy rock', 'happy jazz'], playlists_per_query=2, timeout=2, enough=100)
+
+    assert len(candidates) == 12
+    assert sp.search.call_count == 2
+    assert sp.playlist_tracks.call_count == 4
+
+def test_fan_out_returns_what_arrived_before_the_deadline(app_context):
+    sp = MagicMock()
+    def search(q, type, limit):
+        if q == 'sad slow':
+            time.sleep(0.5)
+        return {'playlists': {'items': [{'id': q}]}}
+    sp.search.side_effect = search
+    sp.playlist_tracks.side_effect = lambda playlist_id: playlist_page(playlist_id, 5)
+
+    started = time.monotonic()
+    candidates = fan_out_candidates(sp, ['sad fast', 'sad slow'], timeout=0.2, enough=100)
+
+    assert time.monotonic() - started < 0.45
+    assert {item['track']['id'] for item in candidates} == {f"sad fast_{i}" for i in range(5)}
+
+def test_build_playlist_ranks_tracks_without_refetching(app_context):
+    tracks = [song_from_item(item, Emotion.JOY) for item in playlist_page('joy', 8)['items']]
+    sp = MagicMock()
+
+    with patch('app.utils.get_random_tracks', return_value=tracks), \
+         patch('app.utils.create_spotify_playlist', return_value='new_playlist'), \
+         patch('app.utils.get_spotify_client', return_value=sp):
+        playlist = build_playlist(Emotion.JOY, top_limit=3)
+
+    assert playlist.playlist_id == 'new_playlist'
+    assert [track.spotify_id for track in playlist.top_tracks] == ['joy_7', 'joy_6', 'joy_5']
+    sp.playlist_tracks.assert_not_called()
+
+def test_local_catalog_errors_fall_back_to_spotify(app_context):
+    sp = MagicMock()
+    sp.search.side_effect = lambda q, type, limit: {'playlists': {'items': [{'id': q}]}}
+    sp.playlist_tracks.side_effect = lambda playlist_id: playlist_page(playlist_id, 15)
+
+    with patch('app.utils.local_tracks', side_effect=RuntimeError('db down')), \
+         patch('app.utils.genre_catalog.sample', return_value=['rock']), patch('app.utils.schedule_ingest'):
+        tracks = get_random_tracks(Emotion.JOY, user_genres=[], sp=sp)
+
+    assert len(tracks) == 15
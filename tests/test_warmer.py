@@ -0,0 +1,41 @@
+from unittest.mock import MagicMock, patch
+from app.extensions import db
+from app.models import Emotion, User, UserGenre
+from app.utils import get_random_tracks
+from app.warmer import PoolStore, PoolWarmer, warm_pools
+
+def track_items(prefix, count):
+    return [{'track': {'id': f"{prefix}{i}", 'name': 'Song', 'artists': [{'name': 'A'}], 'album': {'name': 'B'},
+                       'popularity': i}} for i in range(count)]
+
+def test_store_is_bounded_and_expires_pools():
+    store = PoolStore(maxsize=2)
+    for genre in ('rock', 'jazz', 'soul'):
+        store.put((Emotion.JOY, genre), track_items(genre, 1))
+
+    assert store.get((Emotion.JOY, 'rock'), max_age=60) is None  # Evicted, least recently used
+    assert len(store.get((Emotion.JOY, 'soul'), max_age=60)) == 1
+    assert store.get((Emotion.JOY, 'soul'), max_age=-1) is None  # Too old to serve
+
+def test_warm_refreshes_the_hottest_pairs_first(app):
+    db.session.add_all([User(user_id='u1'), User(user_id='u2'), UserGenre('u1', 'rock'), UserGenre('u2', 'rock'), UserGenre('u1', 'jazz')])
+    db.session.commit()
+    warmer = PoolWarmer()
+    warmer.fetches_per_cycle = 2
+    warmer.demand[(Emotion.SADNESS, 'blues')] = 3
+    warmer._client = MagicMock()
+
+    with patch('app.utils.fan_out_candidates', side_effect=lambda sp, queries, **kwargs: track_items(queries[0], 12)) as fan_out:
+        assert warmer.warm() == 2
+    assert [call.args[1] for call in fan_out.call_args_list] == [['sad blues'], ['happy rock']]
+    assert warmer.demand == {(Emotion.SADNESS, 'blues'): 1}  # Demand decays every cycle
+
+def test_random_tracks_are_sampled_from_a_ready_pool(app):
+    sp = MagicMock()
+    warm_pools.store.put((Emotion.JOY, 'rock'), track_items('t', 30))
+    with app.test_request_context(), patch.object(warm_pools, 'enabled', True), patch.object(warm_pools, 'ensure_started'):
+        tracks = get_random_tracks(Emotion.JOY, user_genres=['rock'], sp=sp)
+    warm_pools.reset()
+
+    assert len(tracks) == 20 and {track.spotify_id for track in tracks} <= {f"t{i}" for i in range(30)}
+    sp.search.assert_not_called()